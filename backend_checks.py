@@ -0,0 +1,243 @@
+import socket
+import sys
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from .fake_lm_server import FakeLMServer
+from .lm_backend_pool import BackendPool
+from .lm_studio import LMStudioManager
+from .request_scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, RequestScheduler, SchedulerBusyError
+
+
+def _complete(client):
+    return client.chat.completions.create(
+        model="fake-model",
+        messages=[{"role": "user", "content": "ping"}],
+        max_tokens=8
+    )
+
+
+def _unused_url() -> str:
+    """Base URL of a local port nothing listens on"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def check_pool_prefers_faster_endpoint():
+    """Sequential requests settle on the endpoint with the lower latency"""
+    with FakeLMServer(latency=0.05) as slow, FakeLMServer(latency=0.0) as fast:
+        pool = BackendPool([slow.base_url, fast.base_url])
+        for _ in range(20):
+            pool.call(_complete)
+        # One warm-up request per endpoint, the rest go to the fast one
+        assert len(slow.requests) <= 2, f"slow endpoint got {len(slow.requests)} of 20 requests"
+        assert len(fast.requests) >= 18
+
+
+def check_pool_spreads_concurrent_requests():
+    """Concurrent requests use every endpoint instead of queueing on one"""
+    with FakeLMServer(latency=0.1) as first, FakeLMServer(latency=0.1) as second:
+        pool = BackendPool([first.base_url, second.base_url])
+        threads = [threading.Thread(target=pool.call, args=(_complete,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert first.requests and second.requests, "all concurrent requests went to one endpoint"
+        assert len(first.requests) + len(second.requests) == 8
+
+
+def check_pool_fails_over_on_server_error():
+    """A 5xx moves the request to another endpoint and takes the failing one out of rotation"""
+    with FakeLMServer(fail=True) as broken, FakeLMServer() as working:
+        pool = BackendPool([broken.base_url, working.base_url])
+        response = pool.call(_complete)
+        assert working.base_url in response.choices[0].message.content
+        broken_metrics, working_metrics = pool.get_metrics()
+        assert broken_metrics["failures_total"] == 1 and not broken_metrics["healthy"]
+        assert working_metrics["failures_total"] == 0 and working_metrics["healthy"]
+
+        # Unhealthy endpoints are skipped until a health check sees them recover
+        pool.call(_complete)
+        assert len(broken.requests) == 1
+        broken.fail = False
+        pool.check_health()
+        assert pool.get_metrics()[0]["healthy"]
+
+
+def check_pool_fails_over_on_connection_error():
+    """A refused connection moves the request to another endpoint"""
+    with FakeLMServer() as working:
+        pool = BackendPool([_unused_url(), working.base_url])
+        response = pool.call(_complete)
+        assert working.base_url in response.choices[0].message.content
+        assert pool.get_metrics()[0]["failures_total"] == 1
+
+
+def check_pool_raises_when_every_endpoint_fails():
+    with FakeLMServer(fail=True) as first, FakeLMServer(fail=True) as second:
+        pool = BackendPool([first.base_url, second.base_url])
+        try:
+            pool.call(_complete)
+        except Exception as e:
+            assert "500" in str(e) or "unavailable" in str(e), e
+        else:
+            raise AssertionError("call succeeded with every endpoint failing")
+
+
+def check_pool_metrics():
+    """Request, failure and latency counters reflect the traffic"""
+    with FakeLMServer(latency=0.02) as server:
+        pool = BackendPool([server.base_url])
+        for _ in range(3):
+            pool.call(_complete)
+        metrics = pool.get_metrics()[0]
+        assert metrics["requests_total"] == 3 and metrics["failures_total"] == 0
+        assert metrics["in_flight"] == 0
+        assert metrics["latency_ewma_ms"] >= 20
+
+
+def check_manager_reports_merged_models():
+    """LMStudioManager.connect merges model lists and names the endpoint that is down"""
+    with FakeLMServer(models=["a", "b"]) as first, FakeLMServer(models=["b", "c"]) as second:
+        manager = LMStudioManager(base_urls=[first.base_url, second.base_url, _unused_url()])
+        success, message, models = manager.connect()
+        assert success and models == ["a", "b", "c"], (success, message, models)
+        assert [m["healthy"] for m in manager.get_endpoint_metrics()] == [True, True, False]
+
+
+def _wait_for(condition: Callable[[], bool], timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for the scheduler")
+        time.sleep(0.001)
+
+
+def _queued(scheduler: RequestScheduler) -> int:
+    metrics = scheduler.get_metrics()
+    return metrics["queued_interactive"] + metrics["queued_batch"]
+
+
+def _grant_order(scheduler: RequestScheduler, requests: List[Tuple[str, int]]) -> List[str]:
+    """Queue requests in the given order behind a held slot and return the order they are served in"""
+    order = []
+    release = threading.Event()
+
+    def hold():
+        with scheduler.slot("holder"):
+            release.wait()
+
+    def request(user, priority):
+        with scheduler.slot(user, priority):
+            order.append(user)
+
+    threads = [threading.Thread(target=hold)]
+    threads[0].start()
+    _wait_for(lambda: scheduler.get_metrics()["active"] == 1)
+    for queued, (user, priority) in enumerate(requests, start=1):
+        thread = threading.Thread(target=request, args=(user, priority))
+        thread.start()
+        threads.append(thread)
+        _wait_for(lambda: _queued(scheduler) == queued)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return order
+
+
+def check_scheduler_round_robin():
+    """A user with a backlog takes turns with others instead of going first"""
+    scheduler = RequestScheduler(max_concurrency=1)
+    order = _grant_order(scheduler, [("a", PRIORITY_INTERACTIVE)] * 4 + [("b", PRIORITY_INTERACTIVE)] * 2)
+    assert order == ["a", "b", "a", "b", "a", "a"], order
+
+
+def check_scheduler_user_weights():
+    """A user with weight 2 gets two requests per round"""
+    scheduler = RequestScheduler(max_concurrency=1, user_weights={"a": 2})
+    order = _grant_order(scheduler, [("a", PRIORITY_INTERACTIVE)] * 4 + [("b", PRIORITY_INTERACTIVE)] * 2)
+    assert order == ["a", "a", "b", "a", "a", "b"], order
+
+
+def check_scheduler_priority():
+    """Interactive requests are served before batch work queued earlier"""
+    scheduler = RequestScheduler(max_concurrency=1)
+    order = _grant_order(scheduler, [("batch", PRIORITY_BATCH)] * 2 + [("chat", PRIORITY_INTERACTIVE)] * 2)
+    assert order == ["chat", "chat", "batch", "batch"], order
+
+
+def check_scheduler_concurrency_and_timeout():
+    """No more than max_concurrency calls run at once; a request that waits too long is rejected"""
+    scheduler = RequestScheduler(max_concurrency=2, queue_timeout=0.05)
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+
+    threads = [threading.Thread(target=scheduler.run, args=(work,), kwargs={"timeout": 5}) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2, max(peak)
+
+    with scheduler.slot("a"), scheduler.slot("b"):
+        try:
+            with scheduler.slot("c"):
+                pass
+        except SchedulerBusyError:
+            pass
+        else:
+            raise AssertionError("slot granted beyond max_concurrency")
+    metrics = scheduler.get_metrics()
+    assert metrics["rejected_total"] == 1 and metrics["active"] == 0, metrics
+    assert metrics["queue_wait_seconds_count"] == 9, metrics
+
+
+POOL_CHECKS = [
+    check_pool_prefers_faster_endpoint,
+    check_pool_spreads_concurrent_requests,
+    check_pool_fails_over_on_server_error,
+    check_pool_fails_over_on_connection_error,
+    check_pool_raises_when_every_endpoint_fails,
+    check_pool_metrics,
+    check_manager_reports_merged_models,
+]
+
+SCHEDULER_CHECKS = [
+    check_scheduler_round_robin,
+    check_scheduler_user_weights,
+    check_scheduler_priority,
+    check_scheduler_concurrency_and_timeout,
+]
+
+
+def run_checks(checks: List[Callable]) -> List[Tuple[str, str]]:
+    """Run each check and return (name, error) for the ones that failed"""
+    failures = []
+    for check in checks:
+        try:
+            check()
+        except Exception as e:
+            failures.append((check.__name__, f"{type(e).__name__}: {e}"))
+            print(f"FAIL {check.__name__}: {e}")
+        else:
+            print(f"ok   {check.__name__}")
+    return failures
+
+
+if __name__ == "__main__":
+    # python -m src.backend_checks
+    sys.exit(1 if run_checks(POOL_CHECKS + SCHEDULER_CHECKS) else 0)
@@ -0,0 +1,119 @@
+import argparse
+import gc
+import os
+import random
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from .chunk_store import ChunkStore, attach_chunk_store
+
+# Word lengths like ordinary English prose; only the amount of text matters here
+WORDS = (
+    "the of and to in is that for it as with was on be by this are from at or an which have not "
+    "document section page figure table system value result data process report analysis method "
+    "measurement requirement installation operation maintenance specification performance"
+).split()
+
+# (source name, page texts) per document
+Documents = List[Tuple[str, List[str]]]
+
+
+def load_pdfs(paths: List[str]) -> Documents:
+    from PyPDF2 import PdfReader
+    return [(os.path.basename(path), [page.extract_text() or "" for page in PdfReader(path).pages]) for path in paths]
+
+
+def synthetic_documents(documents: int, pages: int, seed: int = 42) -> Documents:
+    """Pages of random words, roughly the length of a dense PDF page"""
+    rng = random.Random(seed)
+    return [
+        (f"document_{d}.pdf", [" ".join(rng.choices(WORDS, k=rng.randint(400, 700))) for _ in range(pages)])
+        for d in range(documents)
+    ]
+
+
+def _index(texts: List[str], metadatas: List[dict]):
+    """FAISS vectorstore with one-dimensional dummy vectors, so only the Python-side layout differs"""
+    from langchain.embeddings import FakeEmbeddings
+    from langchain.vectorstores import FAISS
+    return FAISS.from_embeddings(list(zip(texts, [[0.0]] * len(texts))), embedding=FakeEmbeddings(size=1), metadatas=metadatas)
+
+
+def build_legacy(documents: Documents, splitter):
+    """all_chunks as a list of dicts plus a vectorstore with an InMemoryDocstore, as before ChunkStore"""
+    all_chunks = []
+    for source, pages in documents:
+        for j, page_text in enumerate(pages):
+            if page_text:
+                for chunk in splitter.split_text(page_text):
+                    all_chunks.append({"content": chunk, "metadata": {"source": source, "page": j + 1}})
+    vectorstore = _index([chunk["content"] for chunk in all_chunks], [chunk["metadata"] for chunk in all_chunks])
+    return all_chunks, vectorstore
+
+
+def build_chunk_store(documents: Documents, splitter):
+    """ChunkStore plus a vectorstore serving documents from it, as process_pdfs builds them"""
+    store = ChunkStore()
+    for source, pages in documents:
+        for j, page_text in enumerate(pages):
+            if page_text:
+                # The store keeps its own copy of the page, like the freshly extracted text
+                page_index = store.add_page(page_text.encode().decode())
+                store.add_chunks(page_index, splitter.split_text(page_text), {"source": source, "page": j + 1})
+    vectorstore = attach_chunk_store(_index(list(store.texts()), list(store.metadatas())), store)
+    return store, vectorstore
+
+
+def measure(build: Callable, documents: Documents, splitter) -> Tuple[int, object]:
+    """Bytes still allocated by build() once it returns, traced with tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build(documents, splitter)
+        gc.collect()
+        allocated = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return allocated, result
+
+
+def compare_layouts(documents: Documents, chunk_size: int = 2500, chunk_overlap: int = 500) -> Dict:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    # Import LangChain/FAISS modules before tracing so they are not counted
+    _index(["warm up"], [{}])
+    legacy_bytes, legacy = measure(build_legacy, documents, splitter)
+    del legacy
+    store_bytes, (store, vectorstore) = measure(build_chunk_store, documents, splitter)
+    return {
+        "chunks": len(store),
+        "pages": len(store.pages),
+        "legacy_bytes": legacy_bytes,
+        "store_bytes": store_bytes,
+        "reduction": 1 - store_bytes / legacy_bytes if legacy_bytes else 0.0,
+        # The estimate shown in the sidebar and used for session memory accounting
+        "store_estimate_bytes": store.nbytes(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure chunk memory: ChunkStore versus chunk dicts + InMemoryDocstore")
+    parser.add_argument("pdfs", nargs="*", help="PDF files to measure (default: synthetic documents)")
+    parser.add_argument("--documents", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=2500)
+    parser.add_argument("--chunk-overlap", type=int, default=500)
+    args = parser.parse_args()
+
+    documents = load_pdfs(args.pdfs) if args.pdfs else synthetic_documents(args.documents, args.pages)
+    result = compare_layouts(documents, args.chunk_size, args.chunk_overlap)
+    print(f"{result['chunks']} chunks from {result['pages']} pages")
+    print(f"chunk dicts + InMemoryDocstore: {result['legacy_bytes'] / 1e6:8.2f} MB")
+    print(f"ChunkStore + ChunkStoreDocstore: {result['store_bytes'] / 1e6:8.2f} MB ({result['reduction']:.0%} less)")
+    print(f"ChunkStore.nbytes() estimate:    {result['store_estimate_bytes'] / 1e6:8.2f} MB")
+
+
+if __name__ == "__main__":
+    # python -m src.chunk_memory_benchmark [file.pdf ...]
+    main()
@@ -0,0 +1,212 @@
+import sys
+from array import array
+from typing import Dict, Iterator, List, Union
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class ChunkStore:
+    """Compact storage for text chunks.
+
+    Page text is kept once; each chunk is a (page, offset, length) triple in
+    integer arrays pointing into it, plus an id into a table of interned
+    metadata dicts shared by every chunk of the same page. Chunk text is only
+    materialized when asked for. Indexing returns the legacy
+    {"content", "metadata"} dicts, so code that slices `all_chunks` keeps working.
+    """
+
+    def __init__(self):
+        self.pages: List[str] = []
+        self.chunk_page = array("I")
+        self.chunk_offset = array("I")
+        self.chunk_length = array("I")
+        self.chunk_meta = array("I")
+        self._metadata: List[dict] = []
+        self._metadata_ids: Dict[tuple, int] = {}
+
+    def intern_metadata(self, metadata: dict) -> int:
+        """Return the id of an equal metadata dict, storing it on first sight"""
+        key = _freeze(metadata)
+        metadata_id = self._metadata_ids.get(key)
+        if metadata_id is None:
+            metadata_id = len(self._metadata)
+            self._metadata.append({k: sys.intern(v) if isinstance(v, str) else v for k, v in metadata.items()})
+            self._metadata_ids[key] = metadata_id
+        return metadata_id
+
+    def add_page(self, text: str) -> int:
+        self.pages.append(text)
+        return len(self.pages) - 1
+
+    def add_chunks(self, page_index: int, chunks: List[str], metadata: dict):
+        """Record chunks of a page by locating each one in the page text"""
+        page_text = self.pages[page_index]
+        metadata_id = self.intern_metadata(metadata)
+        cursor = 0
+        for chunk in chunks:
+            # Overlapping chunks start after the previous chunk's start
+            offset = page_text.find(chunk, cursor)
+            if offset < 0:
+                offset = page_text.find(chunk)
+            if offset < 0:
+                # The splitter rewrote the text; keep this chunk as its own page
+                self._append(self.add_page(chunk), 0, len(chunk), metadata_id)
+                continue
+            self._append(page_index, offset, len(chunk), metadata_id)
+            cursor = offset + 1
+
+    def _append(self, page_index: int, offset: int, length: int, metadata_id: int):
+        self.chunk_page.append(page_index)
+        self.chunk_offset.append(offset)
+        self.chunk_length.append(length)
+        self.chunk_meta.append(metadata_id)
+
+    def select_canonical(self, canonical: List[int]) -> "ChunkStore":
+        """Keep one copy of each chunk (canonical[i] is chunk i's canonical index).
+
+        Kept chunks whose copies appeared on other pages get an "occurrences"
+        list of every [source, page] pair, their own first, for scoped retrieval
+        and citation. Pages no kept chunk points into are dropped.
+        """
+        occurrences: Dict[int, list] = {}
+        for i, canonical_index in enumerate(canonical):
+            metadata = self._metadata[self.chunk_meta[i]]
+            pair = [metadata.get("source"), metadata.get("page")]
+            seen = occurrences.setdefault(canonical_index, [])
+            if pair not in seen:
+                seen.append(pair)
+
+        store = ChunkStore()
+        page_map: Dict[int, int] = {}
+        for i, canonical_index in enumerate(canonical):
+            if canonical_index != i:
+                continue
+            page = self.chunk_page[i]
+            if page not in page_map:
+                page_map[page] = store.add_page(self.pages[page])
+            metadata = dict(self._metadata[self.chunk_meta[i]])
+            if len(occurrences[i]) > 1:
+                metadata["occurrences"] = occurrences[i]
+            store._append(page_map[page], self.chunk_offset[i], self.chunk_length[i], store.intern_metadata(metadata))
+        return store
+
+    def __len__(self) -> int:
+        return len(self.chunk_page)
+
+    def get_text(self, i: int) -> str:
+        offset = self.chunk_offset[i]
+        return self.pages[self.chunk_page[i]][offset:offset + self.chunk_length[i]]
+
+    def get_metadata(self, i: int) -> dict:
+        # Copy so callers cannot modify the shared interned dict
+        return dict(self._metadata[self.chunk_meta[i]])
+
+    def __getitem__(self, item: Union[int, slice]):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        return {"content": self.get_text(item), "metadata": self.get_metadata(item)}
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def texts(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.get_text(i)
+
+    def metadatas(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self.get_metadata(i)
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable form, keeping pages and offsets rather than chunk text"""
+        return {
+            "pages": self.pages,
+            "chunk_page": self.chunk_page.tolist(),
+            "chunk_offset": self.chunk_offset.tolist(),
+            "chunk_length": self.chunk_length.tolist(),
+            "chunk_meta": self.chunk_meta.tolist(),
+            "metadata": self._metadata,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ChunkStore":
+        store = cls()
+        store.pages = list(data["pages"])
+        for name in ("chunk_page", "chunk_offset", "chunk_length", "chunk_meta"):
+            getattr(store, name).extend(data[name])
+        for metadata in data["metadata"]:
+            store.intern_metadata(metadata)
+        return store
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the store"""
+        arrays = sum(a.itemsize * len(a) for a in (self.chunk_page, self.chunk_offset, self.chunk_length, self.chunk_meta))
+        pages = sum(sys.getsizeof(page) for page in self.pages) + sys.getsizeof(self.pages)
+        metadata = sum(sys.getsizeof(m) + sum(sys.getsizeof(v) for v in m.values()) for m in self._metadata)
+        return arrays + pages + metadata
+
+    def memory_report(self) -> Dict:
+        """Chunk, page and byte counts of the store (cached until chunks change).
+
+        Measured against the dict + docstore layout it replaces with
+        `python -m src.chunk_memory_benchmark`.
+        """
+        cached = getattr(self, "_memory_report", None)
+        if cached and cached["chunks"] == len(self):
+            return cached
+        self._memory_report = {
+            "chunks": len(self),
+            "pages": len(self.pages),
+            "store_bytes": self.nbytes(),
+        }
+        return self._memory_report
+
+
+class ChunkStoreDocstore:
+    """Read-only LangChain docstore that materializes Documents from a ChunkStore.
+
+    Docstore ids are the chunk positions as strings, matching the FAISS ids
+    of an index built from the store in order.
+    """
+
+    def __init__(self, chunk_store: ChunkStore):
+        self.chunk_store = chunk_store
+
+    def search(self, search: str):
+        from langchain.docstore.document import Document
+
+        try:
+            i = int(search)
+        except ValueError:
+            return f"ID {search} not found."
+        if not 0 <= i < len(self.chunk_store):
+            return f"ID {search} not found."
+        return Document(page_content=self.chunk_store.get_text(i), metadata=self.chunk_store.get_metadata(i))
+
+    def add(self, texts: dict):
+        raise NotImplementedError("ChunkStoreDocstore is read-only")
+
+    def delete(self, ids: list):
+        raise NotImplementedError("ChunkStoreDocstore is read-only")
+
+
+def attach_chunk_store(vectorstore, chunk_store: ChunkStore):
+    """Replace a FAISS vectorstore's docstore (built from chunk_store in order) so text is held once"""
+    vectorstore.docstore = ChunkStoreDocstore(chunk_store)
+    vectorstore.index_to_docstore_id = {i: str(i) for i in range(len(chunk_store))}
+    return vectorstore
+
+
+def get_chunk_store(vectorstore) -> ChunkStore:
+    """The ChunkStore behind a vectorstore, or an empty one"""
+    docstore = getattr(vectorstore, "docstore", None)
+    return getattr(docstore, "chunk_store", None) or ChunkStore()
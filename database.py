@@ -1,9 +1,15 @@
 import sqlite3
 import hashlib
 import json
+import re
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 
+# A term with more postings than this per message in the user's history is
+# searched by scanning those messages; probing further would cost more than
+# the scan saves (python -m src.fts_benchmark)
+USER_SCAN_POSTINGS_PER_ROW = 10
+
 
 class DatabaseManager:
     def __init__(self, db_path="pdf_chat.db"):
@@ -62,9 +68,88 @@ class DatabaseManager:
             )
         ''')
         
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chat_history_user ON chat_history (user_id, created_at)"
+        )
+        
+        self.fts_enabled = self.init_fulltext_search(cursor)
+        
         conn.commit()
         conn.close()
         
+    def init_fulltext_search(self, cursor) -> bool:
+        """Create FTS5 indexes over chat messages and document filenames, kept in sync by triggers"""
+        fts_tables = {
+            # fts table: (source table, indexed column)
+            "chat_history_fts": ("chat_history", "content"),
+            "documents_fts": ("documents", "filename"),
+        }
+        try:
+            for fts_table, (table, column) in fts_tables.items():
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts_table,))
+                exists = cursor.fetchone() is not None
+                
+                # The owner column holds a "u<user_id>" token so a MATCH can be
+                # limited to one user. FTS5 still reads every posting of the
+                # query's terms, so a term common across all users costs the
+                # same however short this user's history is
+                cursor.execute(f'''
+                    CREATE VIEW IF NOT EXISTS {fts_table}_source AS
+                    SELECT id, {column}, 'u' || user_id AS owner FROM {table}
+                ''')
+                cursor.execute(f'''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                        {column},
+                        owner,
+                        content='{fts_table}_source',
+                        content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2'
+                    )
+                ''')
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                        INSERT INTO {fts_table} (rowid, {column}, owner) VALUES (new.id, new.{column}, 'u' || new.user_id);
+                    END
+                ''')
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                        INSERT INTO {fts_table} ({fts_table}, rowid, {column}, owner) VALUES ('delete', old.id, old.{column}, 'u' || old.user_id);
+                    END
+                ''')
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {column}, user_id ON {table} BEGIN
+                        INSERT INTO {fts_table} ({fts_table}, rowid, {column}, owner) VALUES ('delete', old.id, old.{column}, 'u' || old.user_id);
+                        INSERT INTO {fts_table} (rowid, {column}, owner) VALUES (new.id, new.{column}, 'u' || new.user_id);
+                    END
+                ''')
+                
+                if not exists:
+                    # Index rows written before full-text search existed
+                    cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5; searches fall back to LIKE
+            return False
+            
+    def search_terms(self, text: str) -> List[Tuple[str, str]]:
+        """(term, "*" or "") pairs of the words in a search, "term*" marking a prefix"""
+        return re.findall(r"(\w+)(\*?)", text)
+        
+    def build_fts_query(self, text: str, column: str, user_id: int) -> str:
+        """Turn free text into a safe FTS5 query for one user: all terms required, "term*" as a prefix"""
+        terms = self.search_terms(text)
+        if not terms:
+            return ""
+        # Prefix matching merges every matching term's full posting list, so
+        # it is only used when asked for explicitly
+        quoted = [f'"{term}"{star}' for term, star in terms]
+        return f'owner : "u{int(user_id)}" AND {column} : ({" ".join(quoted)})'
+        
+    def build_like_pattern(self, text: str) -> str:
+        """LIKE pattern matching the text literally (use with ESCAPE '\\')"""
+        escaped = text.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"%{escaped}%"
+        
     def hash_password(self, password: str) -> str:
         """Hash password using SHA-256"""
         return hashlib.sha256(password.encode()).hexdigest()
@@ -196,4 +281,142 @@ class DatabaseManager:
         cursor.execute("DELETE FROM chat_history WHERE user_id = ?", (user_id,))
         
         conn.commit()
-        conn.close()
\ No newline at end of file
+        conn.close()
+        
+    def prefer_user_scan(self, cursor, user_id: int, terms: List[Tuple[str, str]]) -> bool:
+        """Whether scanning the user's own messages is cheaper than the FTS5 MATCH.
+        
+        The MATCH reads every posting of its terms, whoever searches, while the
+        scan reads only the user's messages. The messages are counted on
+        idx_chat_history_user and each term is probed for at most
+        USER_SCAN_POSTINGS_PER_ROW postings per message.
+        """
+        if any(star for _, star in terms):
+            # A prefix merges the posting lists of every matching term before
+            # the first row comes back, however few of them are this user's
+            return True
+        cursor.execute("SELECT COUNT(*) FROM chat_history WHERE user_id = ?", (user_id,))
+        budget = cursor.fetchone()[0] * USER_SCAN_POSTINGS_PER_ROW
+        for term, _ in terms:
+            cursor.execute(
+                "SELECT COUNT(*) FROM (SELECT rowid FROM chat_history_fts WHERE chat_history_fts MATCH ? LIMIT ?)",
+                (f'content : "{term}"', budget)
+            )
+            if cursor.fetchone()[0] >= budget:
+                return True
+        return False
+        
+    def match_chat_history(self, cursor, fts_query: str, limit: int, offset: int) -> List[tuple]:
+        """Messages matching an FTS5 query, best matches first"""
+        cursor.execute(
+            '''
+            SELECT c.id, c.message_type, c.content, c.created_at,
+                   snippet(chat_history_fts, 0, '**', '**', '...', 16)
+            FROM chat_history_fts
+            JOIN chat_history c ON c.id = chat_history_fts.rowid
+            WHERE chat_history_fts MATCH ?
+            ORDER BY bm25(chat_history_fts, 1.0, 0.0)
+            LIMIT ? OFFSET ?
+            ''',
+            (fts_query, limit, offset)
+        )
+        return cursor.fetchall()
+        
+    def scan_chat_history(self, cursor, user_id: int, terms: List[Tuple[str, str]], limit: int, offset: int) -> List[tuple]:
+        """A user's messages containing every term as a word, newest first"""
+        conditions = " AND ".join(["content LIKE ? ESCAPE '\\'"] * len(terms))
+        cursor.execute(
+            "SELECT id, message_type, content, created_at, substr(content, 1, 200) FROM chat_history "
+            f"WHERE user_id = ? AND {conditions} ORDER BY created_at DESC",
+            (user_id, *[self.build_like_pattern(term) for term, _ in terms])
+        )
+        results = []
+        for row in cursor:
+            # LIKE also matches inside words; keep the FTS5 meaning of a term
+            words = set(re.findall(r"\w+", row[2].lower()))
+            if all(
+                any(word.startswith(term.lower()) for word in words) if star else term.lower() in words
+                for term, star in terms
+            ):
+                results.append(row)
+                if len(results) == offset + limit:
+                    break
+        return results[offset:]
+        
+    def search_chat_history(self, user_id: int, query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Full-text search over a user's chat messages.
+        
+        Best matches come first, except when a term is so common across all
+        users that scanning the user's own messages is cheaper; those results
+        come newest first.
+        """
+        terms = self.search_terms(query)
+        if not terms:
+            return []
+            
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        if not self.fts_enabled:
+            cursor.execute(
+                "SELECT id, message_type, content, created_at, substr(content, 1, 200) FROM chat_history "
+                "WHERE user_id = ? AND content LIKE ? ESCAPE '\\' ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (user_id, self.build_like_pattern(query), limit, offset)
+            )
+            results = cursor.fetchall()
+        elif self.prefer_user_scan(cursor, user_id, terms):
+            results = self.scan_chat_history(cursor, user_id, terms, limit, offset)
+        else:
+            results = self.match_chat_history(cursor, self.build_fts_query(query, "content", user_id), limit, offset)
+        conn.close()
+        
+        return [
+            {
+                'id': row[0],
+                'type': row[1],
+                'content': row[2],
+                'created_at': row[3],
+                'snippet': row[4]
+            }
+            for row in results
+        ]
+        
+    def search_documents(self, user_id: int, query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Full-text search over a user's document filenames, best matches first"""
+        fts_query = self.build_fts_query(query, "filename", user_id)
+        if not fts_query:
+            return []
+            
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        if self.fts_enabled:
+            cursor.execute(
+                '''
+                SELECT d.filename, d.file_hash, d.uploaded_at
+                FROM documents_fts
+                JOIN documents d ON d.id = documents_fts.rowid
+                WHERE documents_fts MATCH ?
+                ORDER BY bm25(documents_fts, 1.0, 0.0)
+                LIMIT ? OFFSET ?
+                ''',
+                (fts_query, limit, offset)
+            )
+        else:
+            cursor.execute(
+                "SELECT filename, file_hash, uploaded_at FROM documents "
+                "WHERE user_id = ? AND filename LIKE ? ESCAPE '\\' ORDER BY uploaded_at DESC LIMIT ? OFFSET ?",
+                (user_id, self.build_like_pattern(query), limit, offset)
+            )
+            
+        results = cursor.fetchall()
+        conn.close()
+        
+        return [
+            {
+                'filename': row[0],
+                'file_hash': row[1],
+                'uploaded_at': row[2]
+            }
+            for row in results
+        ]
\ No newline at end of file
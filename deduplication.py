@@ -0,0 +1,88 @@
+import hashlib
+import re
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+_MERSENNE_31 = (1 << 31) - 1
+
+
+class ChunkDeduplicator:
+    """Finds exact and near-duplicate chunks before they are embedded.
+
+    Exact duplicates are matched on a hash of the whitespace/case-normalized
+    text. Near duplicates use MinHash signatures over word shingles, bucketed
+    with LSH (`bands` x `num_perm / bands` rows); a candidate only counts as a
+    duplicate when its estimated Jaccard similarity reaches `threshold`.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 5, threshold: float = 0.85, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_31, size=num_perm, dtype=np.uint64)
+
+    def normalize(self, text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    def signature(self, normalized: str) -> np.ndarray:
+        """MinHash signature of the text's word shingles"""
+        words = normalized.split(" ")
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) & _MERSENNE_31 for s in shingles), dtype=np.uint64, count=len(shingles))
+        # (a * x + b) mod p stays below 2**63 because a, b, x < 2**31
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_31).min(axis=1)
+
+    def find_duplicates(self, texts: List[str]) -> Dict[str, object]:
+        """Map every chunk to its canonical chunk (the first copy seen).
+
+        Returns {"canonical": [index of canonical chunk per input chunk],
+        "exact": count, "near": count}.
+        """
+        canonical = list(range(len(texts)))
+        exact_seen: Dict[bytes, int] = {}
+        buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        signatures: Dict[int, np.ndarray] = {}
+        exact = near = 0
+
+        for i, text in enumerate(texts):
+            normalized = self.normalize(text)
+            digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+            if digest in exact_seen:
+                canonical[i] = exact_seen[digest]
+                exact += 1
+                continue
+            exact_seen[digest] = i
+
+            signature = self.signature(normalized)
+            band_keys = [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+            match = None
+            for band, key in enumerate(band_keys):
+                for candidate in buckets[band].get(key, ()):
+                    if np.mean(signatures[candidate] == signature) >= self.threshold:
+                        match = candidate
+                        break
+                if match is not None:
+                    break
+
+            if match is not None:
+                canonical[i] = match
+                # Later exact copies of this text point straight at the canonical chunk
+                exact_seen[digest] = match
+                near += 1
+                continue
+
+            # Only canonical chunks go into the LSH index
+            signatures[i] = signature
+            for band, key in enumerate(band_keys):
+                buckets[band].setdefault(key, []).append(i)
+
+        return {"canonical": canonical, "exact": exact, "near": near}
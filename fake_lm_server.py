@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict
+
+
+class FakeLMServer:
+    """Minimal OpenAI-compatible server for exercising LMStudioManager locally.
+
+    Serves GET /v1/models and POST /v1/chat/completions, sleeps `latency`
+    seconds per completion, answers with HTTP 500 while `fail` is set and
+    records every completion request body in `requests`.
+
+        with FakeLMServer(latency=0.05) as server:
+            manager = LMStudioManager(base_urls=[server.base_url])
+    """
+
+    def __init__(self, models: List[str] = None, latency: float = 0.0, fail: bool = False, host="127.0.0.1", port=0):
+        self.models = models or ["fake-model"]
+        self.latency = latency
+        self.fail = fail
+        self.requests: List[Dict] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-lm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/v1/models":
+                    return self._send_json(404, {"error": "not found"})
+                if server.fail:
+                    return self._send_json(500, {"error": "server unavailable"})
+                self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in server.models]})
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/chat/completions":
+                    return self._send_json(404, {"error": "not found"})
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests.append(body)
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.fail:
+                    return self._send_json(500, {"error": {"message": "server unavailable"}})
+
+                prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+                self._send_json(200, {
+                    "id": f"chatcmpl-fake-{len(server.requests)}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", server.models[0]),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": f"Fake answer from {server.base_url}"},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": 5,
+                              "total_tokens": prompt_chars // 4 + 5},
+                })
+
+        return Handler
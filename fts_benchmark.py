@@ -0,0 +1,136 @@
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import string
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from .database import DatabaseManager
+
+
+def vocabulary(size: int, seed: int = 42) -> List[str]:
+    """Distinct made-up words; a word's position is its frequency rank"""
+    rng = random.Random(seed)
+    words = {}
+    while len(words) < size:
+        words.setdefault("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))), None)
+    return list(words)
+
+
+def populate(db_manager: DatabaseManager, rows: int, users: int, words: List[str], batch_size: int = 50_000, seed: int = 42):
+    """Insert synthetic chat messages through the normal table, so the FTS triggers do the indexing.
+
+    Words follow Zipf's law like natural text: the word of rank r appears
+    with frequency proportional to 1/r.
+    """
+    rng = random.Random(seed)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+    conn = sqlite3.connect(db_manager.db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    inserted = 0
+    while inserted < rows:
+        count = min(batch_size, rows - inserted)
+        conn.executemany(
+            "INSERT INTO chat_history (user_id, message_type, content) VALUES (?, ?, ?)",
+            (
+                (rng.randrange(1, users + 1), rng.choice(("human", "ai")),
+                 " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(8, 40))))
+                for _ in range(count)
+            )
+        )
+        conn.commit()
+        inserted += count
+    conn.close()
+
+
+def document_frequency(cursor, term: str, star: str = "") -> int:
+    """Messages of all users containing a term, or a word starting with it"""
+    cursor.execute("SELECT COUNT(*) FROM chat_history_fts WHERE chat_history_fts MATCH ?", (f'content : "{term}"{star}',))
+    return cursor.fetchone()[0]
+
+
+def time_queries(search: Callable[[int, str], list], queries: List[str], users: int, repeats: int = 20) -> Dict:
+    """Latency of ranked, paginated chat-history searches"""
+    rng = random.Random(7)
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            started = time.perf_counter()
+            search(rng.randrange(1, users + 1), query)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+        "max_ms": round(latencies[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark full-text chat history search")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000, help="Distinct words in the synthetic messages")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--db-path", help="Reuse an existing benchmark database instead of a temporary one")
+    args = parser.parse_args()
+
+    db_path = args.db_path or os.path.join(tempfile.mkdtemp(), "fts_benchmark.db")
+    db_manager = DatabaseManager(db_path)
+    words = vocabulary(args.vocabulary)
+
+    if not db_manager.fts_enabled:
+        print("SQLite was built without FTS5; searches use the LIKE fallback")
+        return
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    existing = cursor.execute("SELECT COUNT(*) FROM chat_history").fetchone()[0]
+    if existing < args.rows:
+        started = time.perf_counter()
+        populate(db_manager, args.rows - existing, args.users, words)
+        print(f"Inserted {args.rows - existing:,} rows in {time.perf_counter() - started:.1f}s ({db_path})")
+    print(f"{args.rows:,} messages, about {args.rows // args.users:,} per user, {args.vocabulary:,} distinct words")
+
+    plans = {
+        # What the Search History panel runs
+        "planned": lambda user_id, query: db_manager.search_chat_history(user_id, query, limit=20),
+        "fts": lambda user_id, query: db_manager.match_chat_history(
+            cursor, db_manager.build_fts_query(query, "content", user_id), 20, 0
+        ),
+        "user scan": lambda user_id, query: db_manager.scan_chat_history(
+            cursor, user_id, db_manager.search_terms(query), 20, 0
+        ),
+    }
+    # Three terms per frequency rank band, so the cost of common and rare terms is reported apart
+    rare = words[len(words) // 10:len(words) // 10 + 3]
+    cases = {
+        "commonest": words[0:3],
+        "common": words[10:13],
+        "medium": words[100:103],
+        "rare": rare,
+        "rare + common": [f"{term} {words[0]}" for term in rare],
+        "prefix": [f"{term[:3]}*" for term in words[100:103]],
+    }
+    for name, queries in cases.items():
+        # What FTS5 pays for: postings of the commonest term, whoever searches
+        frequency = max(
+            document_frequency(cursor, term, star) for query in queries for term, star in db_manager.search_terms(query)
+        )
+        line = f"{name:<14} {frequency:>9,} msgs"
+        for plan, search in plans.items():
+            result = time_queries(search, queries, args.users, args.repeats)
+            line += f"  {plan} p50 {result['p50_ms']:>7.2f} p95 {result['p95_ms']:>7.2f} ms"
+        print(line)
+    conn.close()
+
+
+if __name__ == "__main__":
+    # python -m src.fts_benchmark --rows 1000000
+    main()
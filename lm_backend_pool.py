@@ -0,0 +1,165 @@
+import openai
+import requests
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+# Errors worth retrying on another node; anything else (bad request, unknown
+# model, ...) would fail the same way everywhere.
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+    openai.RateLimitError,
+)
+
+
+@dataclass(eq=False)
+class BackendEndpoint:
+    """One OpenAI-compatible server and its routing statistics"""
+    base_url: str
+    client: Optional[object] = None
+    healthy: bool = True
+    models: List[str] = field(default_factory=list)
+    in_flight: int = 0
+    latency_ewma: Optional[float] = None
+    requests_total: int = 0
+    failures_total: int = 0
+    last_error: Optional[str] = None
+    last_checked: Optional[float] = None
+
+    def score(self) -> float:
+        """Lower is better: expected wait given the work already queued on this node"""
+        return (self.in_flight + 1) * (self.latency_ewma or 0.0)
+
+
+class BackendPool:
+    def __init__(self, base_urls: List[str], session: requests.Session = None, timeout=5,
+                 ewma_alpha=0.3, max_retries=1, client_factory: Callable[[str], object] = None):
+        if not base_urls:
+            raise ValueError("BackendPool needs at least one endpoint")
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.ewma_alpha = ewma_alpha
+        self.max_retries = max_retries
+        self.client_factory = client_factory or self._default_client_factory
+        self.endpoints = [BackendEndpoint(base_url=url.rstrip("/")) for url in base_urls]
+        self._lock = threading.Lock()
+
+    def _default_client_factory(self, base_url: str):
+        # With several nodes the pool fails over itself instead of letting the
+        # client retry the same node; a single node keeps the client's retries.
+        client_retries = 0 if len(self.endpoints) > 1 else openai.DEFAULT_MAX_RETRIES
+        return openai.OpenAI(base_url=base_url, api_key="not-needed", max_retries=client_retries)
+
+    def get_client(self, endpoint: BackendEndpoint):
+        """Create the endpoint's OpenAI client on first use"""
+        with self._lock:
+            if endpoint.client is None:
+                endpoint.client = self.client_factory(endpoint.base_url)
+            return endpoint.client
+
+    def acquire(self, model_name: str = None, exclude: List[BackendEndpoint] = ()) -> Optional[BackendEndpoint]:
+        """Pick the least loaded healthy endpoint and count the request as in flight"""
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if model_name:
+                # Unknown model lists (never probed) are treated as "might have it"
+                serving = [e for e in candidates if not e.models or model_name in e.models]
+                candidates = serving or candidates
+            healthy = [e for e in candidates if e.healthy]
+            # When every node looks down, still try one rather than failing outright
+            candidates = healthy or candidates
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=lambda e: (e.score(), e.in_flight))
+            endpoint.in_flight += 1
+            endpoint.requests_total += 1
+            return endpoint
+
+    def release(self, endpoint: BackendEndpoint, latency: float, error: Exception = None):
+        """Record the outcome of a request on an endpoint"""
+        with self._lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+            if error is None:
+                endpoint.healthy = True
+                if endpoint.latency_ewma is None:
+                    endpoint.latency_ewma = latency
+                else:
+                    endpoint.latency_ewma = self.ewma_alpha * latency + (1 - self.ewma_alpha) * endpoint.latency_ewma
+            else:
+                endpoint.failures_total += 1
+                endpoint.last_error = str(error)
+                if isinstance(error, RETRYABLE_ERRORS):
+                    # Taken out of rotation until the next successful health check
+                    endpoint.healthy = False
+
+    def call(self, fn: Callable[[object], object], model_name: str = None):
+        """Run fn(client) on the best endpoint, failing over to another node on retryable errors"""
+        tried = []
+        last_error = None
+        for _ in range(min(len(self.endpoints), 1 + self.max_retries)):
+            endpoint = self.acquire(model_name, exclude=tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+            started = time.perf_counter()
+            try:
+                result = fn(self.get_client(endpoint))
+            except RETRYABLE_ERRORS as e:
+                self.release(endpoint, time.perf_counter() - started, e)
+                last_error = e
+                continue
+            except Exception as e:
+                self.release(endpoint, time.perf_counter() - started, e)
+                raise
+            self.release(endpoint, time.perf_counter() - started)
+            return result
+        raise last_error or RuntimeError("No LM Studio endpoint available")
+
+    def check_endpoint(self, endpoint: BackendEndpoint) -> Tuple[bool, Union[List[str], str]]:
+        """Probe one endpoint's /models and update its health and model list"""
+        try:
+            response = self.session.get(f"{endpoint.base_url}/models", timeout=self.timeout)
+            if response.status_code == 200:
+                result = True, [model["id"] for model in response.json().get("data", [])]
+            else:
+                result = False, f"Failed to connect: {response.status_code} - {response.text}"
+        except requests.exceptions.ConnectionError:
+            result = False, "Connection refused - Is LM Studio running?"
+        except requests.exceptions.Timeout:
+            result = False, "Connection timed out"
+        except Exception as e:
+            result = False, f"Error: {str(e)}"
+
+        success, models_or_error = result
+        with self._lock:
+            endpoint.healthy = success
+            endpoint.last_checked = time.time()
+            if success:
+                endpoint.models = models_or_error
+            else:
+                endpoint.last_error = models_or_error
+        return result
+
+    def check_health(self) -> List[Tuple[bool, Union[List[str], str]]]:
+        """Probe every endpoint, in pool order"""
+        return [self.check_endpoint(endpoint) for endpoint in self.endpoints]
+
+    def get_metrics(self) -> List[Dict]:
+        """Per-endpoint routing metrics"""
+        with self._lock:
+            return [
+                {
+                    "base_url": e.base_url,
+                    "healthy": e.healthy,
+                    "models": list(e.models),
+                    "in_flight": e.in_flight,
+                    "latency_ewma_ms": round(e.latency_ewma * 1000, 1) if e.latency_ewma is not None else None,
+                    "requests_total": e.requests_total,
+                    "failures_total": e.failures_total,
+                    "last_error": e.last_error,
+                }
+                for e in self.endpoints
+            ]
@@ -1,92 +1,162 @@
-import openai
 import requests
-from typing import Tuple, List
+import threading
+import time
+from requests.adapters import HTTPAdapter
+from typing import Tuple, List, Union, Dict
+from .lm_backend_pool import BackendPool
+from .prompt_templates import build_qa_messages, build_summary_messages
+from .request_scheduler import RequestScheduler, SchedulerBusyError, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+
+BUSY_MESSAGE = "The model server is busy right now. Please try again in a moment."
 
 class LMStudioManager:
-    def __init__(self, base_url="http://127.0.0.1:1234/v1", timeout=5):
-        self.base_url = base_url
+    def __init__(self, base_url="http://127.0.0.1:1234/v1", timeout=5, models_cache_ttl=30, pool_size=10,
+                 base_urls: List[str] = None, max_retries=1, scheduler: RequestScheduler = None):
+        # base_urls spreads chat traffic over several LM Studio instances;
+        # base_url stays the primary endpoint for single-server setups.
+        self.base_urls = base_urls or [base_url]
+        self.base_url = self.base_urls[0]
         self.timeout = timeout
+        self.models_cache_ttl = models_cache_ttl
         self.client = None
+        self.session = self._create_session(pool_size)
+        self.pool = BackendPool(self.base_urls, session=self.session, timeout=timeout, max_retries=max_retries)
+        # Admission control in front of the pool; by default one slot per endpoint
+        self.scheduler = scheduler or RequestScheduler(max_concurrency=len(self.base_urls))
+        self._lock = threading.Lock()
+        self._models_cache = None
+        self._models_cached_at = 0.0
+        self._health = (False, "Not checked")
+        self._probe_thread = None
+        self._probe_stop = threading.Event()
+        
+    def _create_session(self, pool_size: int) -> requests.Session:
+        """Create a keep-alive HTTP session with a connection pool"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max(1, len(self.base_urls)), pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
         
     def setup_client(self):
-        """Set up OpenAI client with custom base URL"""
-        self.client = openai.OpenAI(
-            base_url=self.base_url,
-            api_key="not-needed"
-        )
+        """Set up OpenAI client for the primary endpoint"""
+        if self.client is None:
+            self.client = self.pool.get_client(self.pool.endpoints[0])
         return self.client
         
+    def _fetch_models(self) -> Tuple[bool, Union[List[str], str]]:
+        """Probe every endpoint once, merge their model lists and update the cached status"""
+        results = self.pool.check_health()
+        models = []
+        errors = []
+        for endpoint, (success, models_or_error) in zip(self.pool.endpoints, results):
+            if success:
+                models.extend(model for model in models_or_error if model not in models)
+            else:
+                errors.append(models_or_error if len(results) == 1 else f"{endpoint.base_url}: {models_or_error}")
+                
+        success = any(ok for ok, _ in results)
+        with self._lock:
+            if success:
+                self._models_cache = models
+                self._models_cached_at = time.monotonic()
+                self._health = (True, "Connected")
+            else:
+                self._models_cache = None
+                self._health = (False, "; ".join(errors))
+        return (True, models) if success else (False, "; ".join(errors))
+        
+    def connect(self) -> Tuple[bool, str, List[str]]:
+        """Check the connection and list models with a single request"""
+        success, models_or_error = self._fetch_models()
+        if success:
+            return True, "Connected", models_or_error
+        return False, models_or_error, []
+        
     def check_connection(self) -> Tuple[bool, str]:
         """Check if LM Studio API is accessible"""
-        try:
-            response = requests.get(f"{self.base_url}/models", timeout=self.timeout)
-            if response.status_code == 200:
-                return True, "Connected"
-            else:
-                return False, f"Failed to connect: {response.status_code} - {response.text}"
-        except requests.exceptions.ConnectionError:
-            return False, "Connection refused - Is LM Studio running?"
-        except requests.exceptions.Timeout:
-            return False, "Connection timed out"
-        except Exception as e:
-            return False, f"Error: {str(e)}"
+        success, models_or_error = self._fetch_models()
+        return success, "Connected" if success else models_or_error
             
-    def get_available_models(self) -> Tuple[bool, List[str]]:
-        """Get list of available models from LM Studio API"""
-        try:
-            response = requests.get(f"{self.base_url}/models", timeout=self.timeout)
-            if response.status_code == 200:
-                models_data = response.json()
-                return True, [model["id"] for model in models_data.get("data", [])]
-            else:
-                return False, f"Failed to fetch models: {response.status_code} - {response.text}"
-        except Exception as e:
-            return False, f"Error connecting to LM Studio server: {e}"
+    def get_available_models(self, use_cache: bool = True) -> Tuple[bool, Union[List[str], str]]:
+        """Get list of available models from LM Studio API, served from cache within the TTL"""
+        if use_cache:
+            with self._lock:
+                if self._models_cache is not None and time.monotonic() - self._models_cached_at < self.models_cache_ttl:
+                    return True, list(self._models_cache)
+        return self._fetch_models()
+        
+    def get_cached_status(self) -> Tuple[bool, str]:
+        """Return the last known connection status without touching the network"""
+        with self._lock:
+            return self._health
+            
+    def get_endpoint_metrics(self) -> List[Dict]:
+        """Routing metrics for each LM Studio endpoint"""
+        return self.pool.get_metrics()
+        
+    def get_scheduler_metrics(self) -> Dict:
+        """Queue depth and queue-wait metrics of the request scheduler"""
+        return self.scheduler.get_metrics()
+        
+    def start_health_probe(self, interval: float = 15.0):
+        """Poll LM Studio in the background so the UI can read a cached status"""
+        if self._probe_thread and self._probe_thread.is_alive():
+            return
+        self._probe_stop.clear()
+        self._probe_thread = threading.Thread(
+            target=self._run_health_probe, args=(interval,), name="lm-studio-health-probe", daemon=True
+        )
+        self._probe_thread.start()
+        
+    def stop_health_probe(self):
+        """Stop the background health probe"""
+        self._probe_stop.set()
+        if self._probe_thread:
+            self._probe_thread.join(timeout=self.timeout)
+            self._probe_thread = None
+            
+    def _run_health_probe(self, interval: float):
+        while not self._probe_stop.is_set():
+            self._fetch_models()
+            self._probe_stop.wait(interval)
             
-    def get_response(self, context: str, question: str, model_name: str, temperature: float, max_tokens: int) -> Tuple[bool, str]:
+    def get_response(self, context: str, question: str, model_name: str, temperature: float, max_tokens: int,
+                     user_id: int = None) -> Tuple[bool, str]:
         """Get response from OpenAI API based on context and question"""
-        prompt = f"""You are a helpful and informative bot that answers questions using text from the reference context included below. Be sure to respond in a complete sentence, providing in depth, in detail information and including all relevant background information. However, you are talking to a non-technical audience, so be sure to break down complicated concepts and strike a friendly and conversational tone. If the passage is irrelevant to the answer, you may ignore it.
-
-Context: {context}
-
-Question: {question}"""
+        messages = build_qa_messages(context, question)
 
         try:
-            response = self.client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=float(temperature),
-                max_tokens=int(max_tokens)
-            )
+            with self.scheduler.slot(user_id, PRIORITY_INTERACTIVE):
+                response = self.pool.call(lambda client: client.chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    temperature=float(temperature),
+                    max_tokens=int(max_tokens)
+                ), model_name=model_name)
             return True, response.choices[0].message.content.strip()
+        except SchedulerBusyError:
+            return False, BUSY_MESSAGE
         except Exception as e:
             return False, f"Error generating response: {e}"
             
-    def summarize_document(self, chunks: List[dict], model_name: str, temperature: float) -> Tuple[bool, str]:
+    def summarize_document(self, chunks: List[dict], model_name: str, temperature: float, user_id: int = None) -> Tuple[bool, str]:
         """Generate a summary of the document"""
         sample_chunks = chunks[:min(5, len(chunks))]
         sample_text = "\n\n".join([chunk["content"] for chunk in sample_chunks])
         
-        prompt = f"""Please provide a concise summary of the following document. Focus on the main topics and key information.
-
-Document excerpt:
-{sample_text}
-
-Summary:"""
+        messages = build_summary_messages(sample_text)
 
         try:
-            response = self.client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that summarizes documents accurately."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=float(temperature),
-                max_tokens=300
-            )
+            with self.scheduler.slot(user_id, PRIORITY_BATCH):
+                response = self.pool.call(lambda client: client.chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    temperature=float(temperature),
+                    max_tokens=300
+                ), model_name=model_name)
             return True, response.choices[0].message.content.strip()
+        except SchedulerBusyError:
+            return False, BUSY_MESSAGE
         except Exception as e:
             return False, f"Error generating summary: {e}"
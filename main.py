@@ -3,11 +3,49 @@ from src.auth import AuthManager
 from src.database import DatabaseManager
 from src.pdf_processor import PDFProcessor
 from src.lm_studio import LMStudioManager
+from src.request_scheduler import RequestScheduler
+from src.search_service import SearchServiceClient
+from src.session_manager import SessionRegistry
 from src.ui_components import UIComponents
 from src.models import AppState
 import os
+import uuid
 from dotenv import load_dotenv
 
+@st.cache_resource
+def get_lm_studio_manager():
+    """Create one LM Studio manager per process so its HTTP pool, model cache and health probe are shared"""
+    base_urls = [url.strip() for url in os.getenv("LM_STUDIO_BASE_URLS", "").split(",") if url.strip()]
+    manager = LMStudioManager(
+        base_url=os.getenv("LM_STUDIO_BASE_URL", "http://127.0.0.1:1234/v1"),
+        timeout=float(os.getenv("LM_STUDIO_TIMEOUT", "5")),
+        base_urls=base_urls or None,
+        scheduler=RequestScheduler(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", str(max(1, len(base_urls))))),
+            queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+        )
+    )
+    manager.setup_client()
+    manager.start_health_probe(float(os.getenv("LM_STUDIO_HEALTH_INTERVAL", "15")))
+    return manager
+
+@st.cache_resource
+def get_search_client():
+    """Client for the shared search service, if SEARCH_SERVICE_ADDRESS is set"""
+    address = os.getenv("SEARCH_SERVICE_ADDRESS")
+    return SearchServiceClient(address) if address else None
+
+@st.cache_resource
+def get_session_registry():
+    """Process-wide registry that tracks session memory and offloads idle sessions"""
+    memory_limit_mb = float(os.getenv("SESSION_MEMORY_LIMIT_MB", "0"))
+    registry = SessionRegistry(
+        idle_timeout=float(os.getenv("SESSION_IDLE_TIMEOUT", "1800")),
+        memory_ceiling=int(memory_limit_mb * 1e6) or None
+    )
+    registry.start_reaper()
+    return registry
+
 class PDFChatApp:
     def __init__(self):
         load_dotenv()
@@ -26,9 +64,9 @@ class PDFChatApp:
         """Initialize all manager classes"""
         self.db_manager = DatabaseManager()
         self.auth_manager = AuthManager(self.db_manager)
-        self.pdf_processor = PDFProcessor()
-        self.lm_studio_manager = LMStudioManager()
-        self.lm_studio_manager.setup_client() 
+        self.pdf_processor = PDFProcessor(search_client=get_search_client())
+        self.lm_studio_manager = get_lm_studio_manager()
+        self.session_registry = get_session_registry()
         self.ui_components = UIComponents()
         
     def initialize_session_state(self):
@@ -41,6 +79,8 @@ class PDFChatApp:
             st.session_state.user_id = None
         if "username" not in st.session_state:
             st.session_state.username = None
+        if "session_key" not in st.session_state:
+            st.session_state.session_key = uuid.uuid4().hex
 
     def run_auth_flow(self):
         """Handle authentication flow"""
@@ -79,6 +119,10 @@ class PDFChatApp:
                                 ]
                             # ===============================
 
+                            # Warm up the embedding model while the user looks around
+                            if os.getenv("PREWARM_MODELS", "true").lower() == "true" and not self.pdf_processor.search_client:
+                                self.pdf_processor.prewarm()
+
                             st.success("Login successful!")
                             st.rerun()
                         else:
@@ -111,13 +155,24 @@ class PDFChatApp:
     def run_main_app(self):
         """Run the main PDF chat application"""
         app_state = st.session_state.app_state
+        session_key = st.session_state.session_key
         
+        # Idle eviction leaves this session alone until the rerun finishes
+        self.session_registry.begin(session_key, st.session_state.user_id, st.session_state.username, app_state)
+        try:
+            self.render_main_app(app_state)
+        finally:
+            self.session_registry.end(session_key, st.session_state.get("chat_history"))
+            
+    def render_main_app(self, app_state):
+        """Render the header, sidebar and chat for a logged-in user"""
         # Header with logout button
         col1, col2 = st.columns([4, 1])
         with col1:
             st.header("🔍 Chat with PDF Documents using local Model")
         with col2:
             if st.button("Logout", type="secondary"):
+                self.session_registry.forget(st.session_state.session_key)
                 self.auth_manager.logout()
                 st.rerun()
         
@@ -129,6 +184,10 @@ class PDFChatApp:
             if chat_history:
                 st.session_state.chat_history = chat_history
             app_state.chat_history_loaded = True
+            
+        # Bring back state released while the session was idle
+        if app_state.offloaded:
+            self.restore_session(app_state)
         
         # Render sidebar
         self.ui_components.render_sidebar(
@@ -138,6 +197,9 @@ class PDFChatApp:
             st.session_state.user_id,
             self.db_manager
         )
+        admins = [name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()]
+        if st.session_state.username in admins:
+            self.ui_components.render_session_admin(self.session_registry)
         
         # Main chat interface
         if app_state.vectorstore and app_state.openai_client and app_state.selected_model:
@@ -150,6 +212,26 @@ class PDFChatApp:
         else:
             self.ui_components.display_welcome_message()
             
+    def restore_session(self, app_state):
+        """Reload an offloaded session's vectorstore, LLM client and chat history"""
+        with st.spinner("Restoring your session..."):
+            restored, message = self.pdf_processor.rehydrate(app_state)
+            if not restored:
+                st.warning(message)
+            if app_state.connection_status == "Connected":
+                app_state.openai_client = self.lm_studio_manager.setup_client()
+            if app_state.chat_history_offloaded:
+                chat_history = self.db_manager.get_user_chat_history(st.session_state.user_id)
+                if chat_history:
+                    st.session_state.chat_history.extend(chat_history)
+                else:
+                    st.session_state.chat_history.append({
+                        "type": "ai",
+                        "content": "Hello! I'm a PDF Assistant. Ask me anything about your PDFs or Documents.",
+                        "sources": None
+                    })
+                app_state.chat_history_offloaded = False
+            
     def run(self):
         """Main application entry point"""
         self.initialize_session_state()
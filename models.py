@@ -1,5 +1,37 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional
+from .chunk_store import ChunkStore
+
+
+@dataclass
+class RetrievalScope:
+    """Restricts retrieval to some documents and a page range (None means no limit)"""
+    sources: Optional[List[str]] = None
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+    
+    def is_unrestricted(self) -> bool:
+        return self.sources is None and self.page_min is None and self.page_max is None
+        
+    def contains(self, source: str, page) -> bool:
+        if self.sources is not None and source not in self.sources:
+            return False
+        if self.page_min is not None and (not isinstance(page, int) or page < self.page_min):
+            return False
+        if self.page_max is not None and (not isinstance(page, int) or page > self.page_max):
+            return False
+        return True
+        
+    def key(self) -> tuple:
+        sources = tuple(sorted(self.sources)) if self.sources is not None else None
+        return (sources, self.page_min, self.page_max)
+
+
+@dataclass
+class RetrievedChunk:
+    """A retrieved chunk, shaped like a LangChain Document (page_content, metadata)"""
+    page_content: str
+    metadata: dict = field(default_factory=dict)
 
 
 @dataclass
@@ -18,8 +50,14 @@ class AppState:
     chunk_size: int = 2500
     chunk_overlap: int = 500
     similarity_k: int = 5
-    all_chunks: List[dict] = None
+    deduplicate_chunks: bool = True
+    all_chunks: Optional[ChunkStore] = None
     chat_history_loaded: bool = False
+    retrieval_scope: Optional[RetrievalScope] = None
+    scoped_retriever: Optional[object] = None
+    vectorstore_hash: Optional[str] = None
+    offloaded: bool = False
+    chat_history_offloaded: bool = False
     
     def __post_init__(self):
         if self.available_models is None:
@@ -27,8 +65,23 @@ class AppState:
         if self.processed_pdfs is None:
             self.processed_pdfs = []
         if self.all_chunks is None:
-            self.all_chunks = []
+            self.all_chunks = ChunkStore()
             
+    def offload(self) -> bool:
+        """Release the heavy state of an idle session; it is reloaded from the vectorstore cache later"""
+        if self.offloaded:
+            return False
+        released = self.openai_client is not None
+        # A vectorstore only goes if a cached copy (vectorstore_hash) can bring it back
+        if self.vectorstore is not None and self.vectorstore_hash is not None:
+            self.vectorstore = None
+            self.all_chunks = ChunkStore()
+            self.scoped_retriever = None
+            released = True
+        self.openai_client = None
+        self.offloaded = released
+        return released
+        
     def reset_chat_history(self, user_id: int, db_manager):
         """Reset chat history for current user"""
         import streamlit as st
@@ -0,0 +1,92 @@
+import sqlite3
+import zlib
+from typing import List, Optional
+
+
+class PageTextCache:
+    """Extracted PDF page text, stored per file hash and page number.
+
+    Page text is zlib-compressed in a small SQLite file next to the vector
+    stores, so re-chunking a document with new settings only runs the text
+    splitter instead of parsing the PDF again.
+    """
+
+    def __init__(self, db_path="vectorstore/page_text.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def init_database(self):
+        """Create the cache tables"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                file_hash TEXT PRIMARY KEY,
+                page_count INTEGER NOT NULL,
+                parse_seconds REAL NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                file_hash TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                text BLOB NOT NULL,
+                PRIMARY KEY (file_hash, page)
+            ) WITHOUT ROWID
+        ''')
+
+        conn.commit()
+        conn.close()
+
+    def get_pages(self, file_hash: str) -> Optional[List[str]]:
+        """Return the text of every page (1-based page N at index N-1), or None if not cached"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT page_count FROM files WHERE file_hash = ?", (file_hash,))
+        row = cursor.fetchone()
+        if row is None:
+            conn.close()
+            return None
+
+        pages = [""] * row[0]
+        cursor.execute("SELECT page, text FROM pages WHERE file_hash = ?", (file_hash,))
+        for page, blob in cursor.fetchall():
+            pages[page - 1] = zlib.decompress(blob).decode("utf-8")
+        conn.close()
+        return pages
+
+    def put_pages(self, file_hash: str, pages: List[str], parse_seconds: float):
+        """Store the extracted text of a file and how long parsing it took"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("DELETE FROM pages WHERE file_hash = ?", (file_hash,))
+        cursor.executemany(
+            "INSERT INTO pages (file_hash, page, text) VALUES (?, ?, ?)",
+            [
+                (file_hash, number, zlib.compress(text.encode("utf-8"), 6))
+                for number, text in enumerate(pages, start=1)
+                if text
+            ]
+        )
+        cursor.execute(
+            "INSERT OR REPLACE INTO files (file_hash, page_count, parse_seconds) VALUES (?, ?, ?)",
+            (file_hash, len(pages), parse_seconds)
+        )
+
+        conn.commit()
+        conn.close()
+
+    def get_parse_seconds(self, file_hash: str) -> float:
+        """How long the original parse of a cached file took"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT parse_seconds FROM files WHERE file_hash = ?", (file_hash,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row else 0.0
@@ -1,17 +1,72 @@
 import streamlit as st
-from PyPDF2 import PdfReader
 import os
 import pickle
+import copy
 import hashlib
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
-from typing import List, Dict, Optional, Tuple
+import threading
+import time
+from typing import List, Dict, Optional, Tuple, Union
+from .chunk_store import ChunkStore, attach_chunk_store, get_chunk_store
+from .deduplication import ChunkDeduplicator
+from .page_text_cache import PageTextCache
+
+# PyPDF2, LangChain and sentence-transformers (torch) are imported lazily inside
+# the methods that need them, so the login page does not pay for them.
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+_prewarm_thread = None
+
+
+def loaded_embeddings():
+    """The process-wide embedding model if it has been loaded, without loading it"""
+    return _embeddings
+
 
 class PDFProcessor:
-    def __init__(self, vector_store_path="vectorstore"):
+    def __init__(self, vector_store_path="vectorstore", search_client=None):
         self.vector_store_path = vector_store_path
+        # With a search service client, indexes and the embedding model live
+        # in the shared service instead of this worker process
+        self.search_client = search_client
         os.makedirs(vector_store_path, exist_ok=True)
+        self.page_text_cache = PageTextCache(os.path.join(vector_store_path, "page_text.db"))
+        
+    def get_text_splitter(self, chunk_size: int, chunk_overlap: int):
+        """Create a text splitter, importing LangChain on first use"""
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap
+        )
+        
+    def get_embeddings(self):
+        """Load the embedding model once per process and share it between sessions"""
+        global _embeddings
+        with _embeddings_lock:
+            if _embeddings is None:
+                from langchain.embeddings import HuggingFaceEmbeddings
+                _embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        return _embeddings
+        
+    def prewarm(self):
+        """Import heavy dependencies and load the embedding model in a background thread"""
+        global _prewarm_thread
+        if _embeddings is not None or (_prewarm_thread and _prewarm_thread.is_alive()):
+            return
+        _prewarm_thread = threading.Thread(target=self._prewarm, name="pdf-processor-prewarm", daemon=True)
+        _prewarm_thread.start()
+        
+    def _prewarm(self):
+        try:
+            import PyPDF2  # noqa: F401
+            from langchain.vectorstores import FAISS  # noqa: F401
+            self.get_text_splitter(1000, 0)
+            self.get_embeddings()
+        except Exception:
+            # Prewarming is best effort; ingest will surface real errors.
+            pass
         
     def get_document_hash(self, pdf_docs) -> str:
         """Create a hash of the PDF files to use as identifier for vectorstore"""
@@ -22,13 +77,22 @@ class PDFProcessor:
             pdf.seek(0)  # Reset file pointer after reading
         return hasher.hexdigest()
         
-    def get_vector_store(self, text_chunks: List[Dict], embeddings) -> Optional[object]:
+    def get_pipeline_hash(self, pdf_hash: str, chunk_size: int, chunk_overlap: int, deduplicate: bool = False) -> str:
+        """Identify a vectorstore by its PDFs and the chunk settings used to build it"""
+        key = f"{pdf_hash}:{chunk_size}:{chunk_overlap}" + (":dedup" if deduplicate else "")
+        return hashlib.md5(key.encode()).hexdigest()
+        
+    def get_vector_store(self, text_chunks: Union[ChunkStore, List[Dict]], embeddings) -> Optional[object]:
         """Create vector store from text chunks using local embeddings"""
         try:
+            from langchain.vectorstores import FAISS
             texts = [chunk["content"] for chunk in text_chunks]
             metadatas = [chunk["metadata"] for chunk in text_chunks]
             
             vectorstore = FAISS.from_texts(texts=texts, embedding=embeddings, metadatas=metadatas)
+            if isinstance(text_chunks, ChunkStore):
+                # Serve documents from the chunk store instead of a second copy of every chunk
+                attach_chunk_store(vectorstore, text_chunks)
             
             return vectorstore
         except Exception as e:
@@ -36,8 +100,25 @@ class PDFProcessor:
             st.error("Your file might be scanned or the embedding model might have issues.")
             return None
             
+    def get_remote_vector_store(self, text_chunks: ChunkStore, file_hash: str) -> Optional[object]:
+        """Have the search service embed and index the chunks"""
+        try:
+            return self.search_client.build_index(file_hash, text_chunks)
+        except Exception as e:
+            st.error(f"Search service could not create embeddings: {e}")
+            return None
+            
+    def load_chunk_store(self, vectorstore) -> ChunkStore:
+        """The chunks behind a local or search-service vectorstore"""
+        if hasattr(vectorstore, "get_chunk_store"):
+            return vectorstore.get_chunk_store()
+        return get_chunk_store(vectorstore)
+        
     def save_vectorstore(self, vectorstore, file_hash: str):
-        """Save vectorstore to disk"""
+        """Save vectorstore to disk, without the embedding model"""
+        # The model is reattached on load, so the pickle does not carry its own copy
+        vectorstore = copy.copy(vectorstore)
+        vectorstore.embedding_function = None
         with open(f"{self.vector_store_path}/{file_hash}.pkl", "wb") as f:
             pickle.dump(vectorstore, f)
             
@@ -47,11 +128,40 @@ class PDFProcessor:
             path = f"{self.vector_store_path}/{file_hash}.pkl"
             if os.path.exists(path):
                 with open(path, "rb") as f:
-                    return pickle.load(f)
+                    vectorstore = pickle.load(f)
+                # Older caches carry a model copy of their own; drop it for the shared one
+                vectorstore.embedding_function = self.get_embeddings()
+                return vectorstore
         except Exception as e:
             st.warning(f"Error loading vectorstore: {e}")
         return None
         
+    def rehydrate(self, app_state) -> Tuple[bool, str]:
+        """Reload an offloaded session's vectorstore and chunks from the vectorstore cache.
+        
+        If the cache cannot be reached the session stays offloaded, so the
+        next rerun tries again.
+        """
+        if app_state.vectorstore is None and app_state.vectorstore_hash:
+            try:
+                if self.search_client:
+                    vectorstore = self.search_client.open_index(app_state.vectorstore_hash)
+                else:
+                    vectorstore = self.load_vectorstore(app_state.vectorstore_hash)
+                all_chunks = self.load_chunk_store(vectorstore) if vectorstore is not None else None
+            except Exception as e:
+                return False, f"Could not restore your documents ({e}). Retrying on your next action."
+            if vectorstore is None:
+                # The cache entry is gone; the documents have to be processed again
+                app_state.vectorstore_hash = None
+                app_state.processed_pdfs = []
+                app_state.offloaded = False
+                return False, "Your processed documents are no longer cached. Please process your PDFs again."
+            app_state.vectorstore = vectorstore
+            app_state.all_chunks = all_chunks
+        app_state.offloaded = False
+        return True, ""
+        
     def process_pdfs(self, pdf_docs, app_state, user_id: int, db_manager):
         """Process uploaded PDFs and create vectorstore"""
         app_state.is_processing = True
@@ -59,12 +169,22 @@ class PDFProcessor:
         status_text = st.sidebar.empty()
         
         try:
-            # Check if we have a cached vectorstore for these exact PDFs
+            from PyPDF2 import PdfReader
+            
+            # Check if we have a cached vectorstore for these exact PDFs and chunk settings
             pdf_hash = self.get_document_hash(pdf_docs)
-            cached_vectorstore = self.load_vectorstore(pdf_hash)
+            vectorstore_hash = self.get_pipeline_hash(
+                pdf_hash, app_state.chunk_size, app_state.chunk_overlap, app_state.deduplicate_chunks
+            )
+            if self.search_client:
+                cached_vectorstore = self.search_client.open_index(vectorstore_hash)
+            else:
+                cached_vectorstore = self.load_vectorstore(vectorstore_hash)
             
             if cached_vectorstore:
                 app_state.vectorstore = cached_vectorstore
+                app_state.all_chunks = self.load_chunk_store(cached_vectorstore)
+                app_state.vectorstore_hash = vectorstore_hash
                 app_state.processed_pdfs = [pdf.name for pdf in pdf_docs]
                 status_text.success("Loaded vector store from cache!")
                 progress_bar.progress(1.0)
@@ -76,60 +196,78 @@ class PDFProcessor:
                 return
                 
             # Process the PDFs
-            app_state.all_chunks = []
+            app_state.all_chunks = ChunkStore()
             total_pdfs = len(pdf_docs)
             
+            parse_seconds_saved = 0.0
+            text_splitter = self.get_text_splitter(app_state.chunk_size, app_state.chunk_overlap)
+            
             for i, pdf in enumerate(pdf_docs):
                 status_text.text(f"Processing {pdf.name} ({i+1}/{total_pdfs})")
                 
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=app_state.chunk_size,
-                    chunk_overlap=app_state.chunk_overlap
-                )
+                # Parsed page text is cached per file, so only the splitter
+                # runs again when chunk settings change
+                file_hash = self.get_document_hash([pdf])
+                pages = self.page_text_cache.get_pages(file_hash)
+                if pages is None:
+                    parse_started = time.perf_counter()
+                    pages = [page.extract_text() or "" for page in PdfReader(pdf).pages]
+                    self.page_text_cache.put_pages(file_hash, pages, time.perf_counter() - parse_started)
+                else:
+                    parse_seconds_saved += self.page_text_cache.get_parse_seconds(file_hash)
                 
-                pdf_reader = PdfReader(pdf)
-                pdf_chunks = []
-                total_pages = len(pdf_reader.pages)
+                total_pages = len(pages)
                 
-                for j, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
+                for j, page_text in enumerate(pages):
                     if page_text:
                         page_chunks = text_splitter.split_text(page_text)
-                        for chunk in page_chunks:
-                            pdf_chunks.append({
-                                "content": chunk,
-                                "metadata": {
-                                    "source": pdf.name,
-                                    "page": j + 1
-                                }
-                            })
+                        page_index = app_state.all_chunks.add_page(page_text)
+                        app_state.all_chunks.add_chunks(page_index, page_chunks, {"source": pdf.name, "page": j + 1})
                     
                     progress = (i + (j + 1) / total_pages) / total_pdfs
                     progress_bar.progress(min(progress * 0.8, 0.8))
-                
-                app_state.all_chunks.extend(pdf_chunks)
+            
+            # Drop repeated boilerplate before paying for its embeddings
+            duplicates_skipped = 0
+            if app_state.deduplicate_chunks and len(app_state.all_chunks):
+                status_text.text("Removing duplicate chunks...")
+                total_chunks = len(app_state.all_chunks)
+                duplicates = ChunkDeduplicator().find_duplicates(list(app_state.all_chunks.texts()))
+                app_state.all_chunks = app_state.all_chunks.select_canonical(duplicates["canonical"])
+                duplicates_skipped = total_chunks - len(app_state.all_chunks)
             
             # Create embeddings
             status_text.text("Creating vector embeddings...")
             progress_bar.progress(0.9)
             
-            embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-            
-            vectorstore = self.get_vector_store(app_state.all_chunks, embeddings)
+            if self.search_client:
+                vectorstore = self.get_remote_vector_store(app_state.all_chunks, vectorstore_hash)
+            else:
+                embeddings = self.get_embeddings()
+                vectorstore = self.get_vector_store(app_state.all_chunks, embeddings)
             
             if vectorstore:
                 app_state.vectorstore = vectorstore
+                app_state.vectorstore_hash = None
                 app_state.processed_pdfs = [pdf.name for pdf in pdf_docs]
                 
                 # Save vectorstore and document info
                 try:
-                    self.save_vectorstore(vectorstore, pdf_hash)
+                    if not self.search_client:
+                        self.save_vectorstore(vectorstore, vectorstore_hash)
+                    app_state.vectorstore_hash = vectorstore_hash
                     for pdf in pdf_docs:
                         db_manager.save_document(user_id, pdf.name, pdf_hash)
                 except Exception as e:
                     status_text.warning(f"Note: Could not cache vectorstore: {str(e)}")
                 
-                status_text.success("PDFs processed successfully!")
+                notes = []
+                if parse_seconds_saved:
+                    notes.append(f"Page text cache saved {parse_seconds_saved:.1f}s of PDF parsing.")
+                if duplicates_skipped:
+                    notes.append(f"Skipped {duplicates_skipped} duplicate chunk embeddings "
+                                 f"({duplicates['exact']} exact, {duplicates['near']} near-duplicate).")
+                status_text.success(" ".join(["PDFs processed successfully!"] + notes))
                 progress_bar.progress(1.0)
             else:
                 status_text.error("Failed to create vectorstore")
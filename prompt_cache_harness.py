@@ -0,0 +1,97 @@
+import random
+import re
+from typing import Callable, Dict, List
+
+from .fake_lm_server import FakeLMServer
+from .lm_studio import LMStudioManager
+from .prompt_templates import format_context
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (words and punctuation), good enough to compare layouts"""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def serialize_messages(messages: List[Dict]) -> str:
+    """Flatten chat messages the way a chat template concatenates them"""
+    return "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in messages)
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def legacy_context(chunks: List[Dict]) -> str:
+    """Context layout used before prompt_templates: relevance order, no sorting"""
+    return "\n\n".join(f"[Document: {c['source']}, Page: {c['page']}]\n{c['content']}" for c in chunks)
+
+
+def make_conversation(turns: int = 8, k: int = 5, seed: int = 7) -> List[Dict]:
+    """Synthetic follow-up questions whose top-k results overlap but come back in varying order"""
+    rng = random.Random(seed)
+    corpus = [
+        {"source": f"manual_{doc}.pdf", "page": page,
+         "content": " ".join(f"word{rng.randint(0, 5000)}" for _ in range(300))}
+        for doc in range(3) for page in range(1, 11)
+    ]
+    focus = rng.sample(corpus, k + 2)
+    conversation = []
+    for turn in range(turns):
+        # Follow-ups mostly re-retrieve the same chunks, sometimes with one
+        # swapped out, and the relevance order changes from turn to turn
+        retrieved = focus[:k]
+        if rng.random() < 0.5:
+            retrieved[rng.randrange(k)] = focus[k + rng.randrange(len(focus) - k)]
+        rng.shuffle(retrieved)
+        conversation.append({"question": f"Follow-up question number {turn + 1}?", "chunks": retrieved})
+    return conversation
+
+
+def run_harness(conversation: List[Dict] = None, context_builder: Callable[[List[Dict]], str] = format_context,
+                model_name: str = "fake-model") -> List[Dict]:
+    """Send a conversation through LMStudioManager against a fake server and measure prefix reuse per turn"""
+    conversation = conversation or make_conversation()
+    results = []
+    with FakeLMServer(models=[model_name]) as server:
+        manager = LMStudioManager(base_urls=[server.base_url])
+        previous = ""
+        for turn, step in enumerate(conversation, start=1):
+            success, answer = manager.get_response(context_builder(step["chunks"]), step["question"], model_name, 0.0, 64)
+            if not success:
+                raise RuntimeError(answer)
+            prompt = serialize_messages(server.requests[-1]["messages"])
+            prefix = common_prefix_length(previous, prompt)
+            results.append({
+                "turn": turn,
+                "prompt_chars": len(prompt),
+                "prompt_tokens": approx_tokens(prompt),
+                "shared_prefix_tokens": approx_tokens(prompt[:prefix]),
+                "prefix_overlap": prefix / len(prompt) if prompt else 0.0,
+            })
+            previous = prompt
+    return results
+
+
+def format_report(title: str, results: List[Dict]) -> str:
+    lines = [title, f"{'turn':>4} {'prompt tok':>10} {'shared tok':>10} {'overlap':>8}"]
+    for r in results:
+        lines.append(f"{r['turn']:>4} {r['prompt_tokens']:>10} {r['shared_prefix_tokens']:>10} {r['prefix_overlap']:>8.1%}")
+    follow_ups = results[1:]
+    if follow_ups:
+        mean = sum(r["prefix_overlap"] for r in follow_ups) / len(follow_ups)
+        lines.append(f"mean follow-up overlap: {mean:.1%}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python -m src.prompt_cache_harness
+    conversation = make_conversation()
+    print(format_report("Legacy layout (relevance order)", run_harness(conversation, legacy_context)))
+    print()
+    print(format_report("Stable layout (source/page order)", run_harness(conversation)))
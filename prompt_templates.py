@@ -0,0 +1,53 @@
+from typing import Dict, List
+
+# Static instructions live in the system message and must stay byte-identical
+# between turns: local servers (LM Studio / llama.cpp) reuse the KV cache for
+# the longest common prompt prefix, so anything that varies per turn goes last.
+QA_SYSTEM_PROMPT = (
+    "You are a helpful and informative bot that answers questions using text from the reference context "
+    "included below. Be sure to respond in a complete sentence, providing in depth, in detail information "
+    "and including all relevant background information. However, you are talking to a non-technical audience, "
+    "so be sure to break down complicated concepts and strike a friendly and conversational tone. "
+    "If the passage is irrelevant to the answer, you may ignore it."
+)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You are a helpful assistant that summarizes documents accurately. "
+    "Please provide a concise summary of the document excerpt you are given. "
+    "Focus on the main topics and key information."
+)
+
+
+def _chunk_sort_key(chunk: Dict):
+    page = chunk.get("page")
+    page_number = page if isinstance(page, int) else float("inf")
+    return (str(chunk.get("source", "")), page_number, chunk.get("content", ""))
+
+
+def order_chunks(chunks: List[Dict]) -> List[Dict]:
+    """Order retrieved chunks by source and page so the same chunks always render the same way"""
+    return sorted(chunks, key=_chunk_sort_key)
+
+
+def format_context(chunks: List[Dict]) -> str:
+    """Render chunks ({"source", "page", "content"}) as a deterministic context block"""
+    return "\n\n".join(
+        f"[Document: {chunk.get('source', 'Unknown')}, Page: {chunk.get('page', 'Unknown')}]\n{chunk.get('content', '')}"
+        for chunk in order_chunks(chunks)
+    )
+
+
+def build_qa_messages(context: str, question: str) -> List[Dict]:
+    """Messages for a question answered from retrieved context"""
+    return [
+        {"role": "system", "content": QA_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"},
+    ]
+
+
+def build_summary_messages(excerpt: str) -> List[Dict]:
+    """Messages for summarizing a document excerpt"""
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Document excerpt:\n{excerpt}\n\nSummary:"},
+    ]
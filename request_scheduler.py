@@ -0,0 +1,156 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Optional
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+# Upper bounds (seconds) of the queue-wait histogram buckets
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class SchedulerBusyError(Exception):
+    """Raised when a request waited longer than the queue timeout"""
+
+
+@dataclass(eq=False)
+class _Ticket:
+    user_key: Hashable
+    priority: int
+    enqueued_at: float
+    granted: bool = False
+
+
+class RequestScheduler:
+    """Admission control for LLM calls.
+
+    At most `max_concurrency` calls run at once. Waiting calls are served
+    strictly by priority (interactive chat before summaries and batch work)
+    and, within a priority, round-robin across users so one busy session
+    cannot starve the others. `user_weights` lets a user take several turns
+    per round.
+    """
+
+    def __init__(self, max_concurrency: int = 2, queue_timeout: float = 60.0, user_weights: Dict[Hashable, int] = None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.user_weights = user_weights or {}
+        self._cond = threading.Condition()
+        self._queues = {PRIORITY_INTERACTIVE: OrderedDict(), PRIORITY_BATCH: OrderedDict()}
+        self._credits = {}
+        self._active = 0
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+        self._wait_count = 0
+        self._wait_sum = 0.0
+        self._wait_max = 0.0
+        self._rejected = 0
+
+    @contextmanager
+    def slot(self, user_id: Hashable = None, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None):
+        """Block until a concurrency slot is granted; raise SchedulerBusyError on timeout"""
+        self._acquire(user_id, priority, self.queue_timeout if timeout is None else timeout)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def run(self, fn: Callable, user_id: Hashable = None, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None):
+        """Run fn() once a slot is available"""
+        with self.slot(user_id, priority, timeout):
+            return fn()
+
+    def _acquire(self, user_id: Hashable, priority: int, timeout: float):
+        ticket = _Ticket(user_key=user_id, priority=priority, enqueued_at=time.monotonic())
+        deadline = ticket.enqueued_at + timeout
+        with self._cond:
+            self._queues[priority].setdefault(user_id, deque()).append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    self._rejected += 1
+                    self._record_wait(time.monotonic() - ticket.enqueued_at)
+                    raise SchedulerBusyError(f"Request waited {timeout:g}s in the queue")
+                self._cond.wait(remaining)
+            self._record_wait(time.monotonic() - ticket.enqueued_at)
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to waiting tickets; caller holds the condition lock"""
+        granted = False
+        while self._active < self.max_concurrency:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            ticket.granted = True
+            self._active += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if not users:
+                continue
+            user_key, tickets = next(iter(users.items()))
+            ticket = tickets.popleft()
+            credits = self._credits.get((priority, user_key), self.user_weights.get(user_key, 1)) - 1
+            if not tickets:
+                del users[user_key]
+                self._credits.pop((priority, user_key), None)
+            elif credits <= 0:
+                # Turn used up: go to the back of the round-robin
+                users.move_to_end(user_key)
+                self._credits.pop((priority, user_key), None)
+            else:
+                self._credits[(priority, user_key)] = credits
+            return ticket
+        return None
+
+    def _remove(self, ticket: _Ticket):
+        users = self._queues[ticket.priority]
+        tickets = users.get(ticket.user_key)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del users[ticket.user_key]
+                self._credits.pop((ticket.priority, ticket.user_key), None)
+
+    def _record_wait(self, wait: float):
+        self._wait_buckets[bisect.bisect_left(WAIT_BUCKETS, wait)] += 1
+        self._wait_count += 1
+        self._wait_sum += wait
+        self._wait_max = max(self._wait_max, wait)
+
+    def get_metrics(self) -> Dict:
+        """Queue depth, concurrency and queue-wait statistics"""
+        with self._cond:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(WAIT_BUCKETS + (float("inf"),), self._wait_buckets):
+                cumulative += count
+                buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+            return {
+                "active": self._active,
+                "max_concurrency": self.max_concurrency,
+                "queued_interactive": sum(len(t) for t in self._queues[PRIORITY_INTERACTIVE].values()),
+                "queued_batch": sum(len(t) for t in self._queues[PRIORITY_BATCH].values()),
+                "rejected_total": self._rejected,
+                "queue_wait_seconds_count": self._wait_count,
+                "queue_wait_seconds_sum": round(self._wait_sum, 4),
+                "queue_wait_seconds_max": round(self._wait_max, 4),
+                "queue_wait_seconds_avg": round(self._wait_sum / self._wait_count, 4) if self._wait_count else 0.0,
+                "queue_wait_seconds_bucket": buckets,
+            }
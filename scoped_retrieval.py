@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .models import RetrievalScope
+
+
+def embed_query(vectorstore, query: str) -> List[float]:
+    """Embed a query with the vectorstore's own embedding model"""
+    if hasattr(vectorstore, "_embed_query"):
+        return vectorstore._embed_query(query)
+    embedding_function = vectorstore.embedding_function
+    if hasattr(embedding_function, "embed_query"):
+        return embedding_function.embed_query(query)
+    return embedding_function(query)
+
+
+class ScopedRetriever:
+    """Similarity search restricted to a document / page scope.
+
+    The scope is applied before scoring: the FAISS ids of matching chunks are
+    looked up from a per-source, page-sorted id table, their vectors are copied
+    into a small flat sub-index and only that sub-index is searched. Search
+    cost therefore follows the size of the selected subset, not the corpus.
+    Sub-indexes for recently used scopes are kept in a small LRU cache.
+    """
+
+    def __init__(self, vectorstore, max_cached_scopes: int = 8):
+        self.vectorstore = vectorstore
+        self.max_cached_scopes = max_cached_scopes
+        self._lock = threading.Lock()
+        self._id_table: Optional[Dict[str, tuple]] = None
+        self._sub_indexes = OrderedDict()
+
+    def _build_id_table(self) -> Dict[str, tuple]:
+        """Map each source to (sorted page numbers, matching FAISS ids)"""
+        rows: Dict[str, list] = {}
+        chunk_store = getattr(self.vectorstore.docstore, "chunk_store", None)
+        for faiss_id, docstore_id in self.vectorstore.index_to_docstore_id.items():
+            if chunk_store is not None:
+                # Read metadata straight from the store without materializing chunk text
+                metadata = chunk_store.get_metadata(int(docstore_id))
+            else:
+                metadata = self.vectorstore.docstore.search(docstore_id).metadata
+            # Deduplicated chunks are listed under every page they appeared on
+            for source, page in metadata.get("occurrences") or [(metadata.get("source", "Unknown"), metadata.get("page"))]:
+                rows.setdefault(source, []).append((page if isinstance(page, int) else 0, faiss_id))
+        table = {}
+        for source, pairs in rows.items():
+            pairs.sort()
+            table[source] = (
+                np.array([page for page, _ in pairs], dtype=np.int64),
+                np.array([faiss_id for _, faiss_id in pairs], dtype=np.int64),
+            )
+        return table
+
+    def candidate_ids(self, scope: RetrievalScope) -> np.ndarray:
+        """FAISS ids of every chunk inside the scope"""
+        with self._lock:
+            if self._id_table is None:
+                self._id_table = self._build_id_table()
+            table = self._id_table
+
+        sources = table.keys() if scope.sources is None else [s for s in scope.sources if s in table]
+        selected = []
+        for source in sources:
+            pages, ids = table[source]
+            start = 0 if scope.page_min is None else np.searchsorted(pages, scope.page_min, side="left")
+            end = len(pages) if scope.page_max is None else np.searchsorted(pages, scope.page_max, side="right")
+            selected.append(ids[start:end])
+        # A deduplicated chunk can match the scope through several pages
+        return np.unique(np.concatenate(selected)) if selected else np.empty(0, dtype=np.int64)
+
+    def _get_sub_index(self, scope: RetrievalScope):
+        import faiss
+
+        key = scope.key()
+        with self._lock:
+            if key in self._sub_indexes:
+                self._sub_indexes.move_to_end(key)
+                return self._sub_indexes[key]
+
+        ids = self.candidate_ids(scope)
+        index = self.vectorstore.index
+        sub_index = faiss.IndexFlat(index.d, index.metric_type)
+        if len(ids):
+            try:
+                vectors = index.reconstruct_batch(ids)
+            except RuntimeError:
+                vectors = np.vstack([index.reconstruct(int(i)) for i in ids])
+            sub_index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            self._sub_indexes[key] = (sub_index, ids)
+            while len(self._sub_indexes) > self.max_cached_scopes:
+                self._sub_indexes.popitem(last=False)
+        return sub_index, ids
+
+    def similarity_search(self, query: str, k: int = 4, scope: Optional[RetrievalScope] = None) -> list:
+        """Return the k most similar chunks inside the scope"""
+        if scope is None or scope.is_unrestricted():
+            return self.vectorstore.similarity_search(query, k=k)
+        return self.similarity_search_by_vector(embed_query(self.vectorstore, query), k, scope)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, scope: Optional[RetrievalScope] = None) -> list:
+        """Same as similarity_search for an already embedded query"""
+        if scope is None or scope.is_unrestricted():
+            return self.vectorstore.similarity_search_by_vector(embedding, k=k)
+
+        sub_index, ids = self._get_sub_index(scope)
+        if not len(ids):
+            return []
+
+        query_vector = np.array([embedding], dtype=np.float32)
+        if getattr(self.vectorstore, "_normalize_L2", False):
+            import faiss
+            faiss.normalize_L2(query_vector)
+        _, positions = sub_index.search(query_vector, min(k, len(ids)))
+
+        docs = []
+        for position in positions[0]:
+            if position < 0:
+                continue
+            docstore_id = self.vectorstore.index_to_docstore_id[int(ids[position])]
+            docs.append(self.vectorstore.docstore.search(docstore_id))
+        return docs
+
+
+def cite_chunk(metadata: dict, scope: Optional[RetrievalScope] = None) -> Tuple[str, object, List[list]]:
+    """Pick the (source, page) to cite for a retrieved chunk and list its other occurrences.
+
+    A deduplicated chunk is cited by its first occurrence inside the scope,
+    which is the one that made it match.
+    """
+    primary = [metadata.get("source", "Unknown"), metadata.get("page", "Unknown")]
+    occurrences = [list(pair) for pair in metadata.get("occurrences") or [primary]]
+    cited = primary
+    if scope is not None and not scope.is_unrestricted() and not scope.contains(*primary):
+        cited = next((pair for pair in occurrences if scope.contains(*pair)), primary)
+    return cited[0], cited[1], [pair for pair in occurrences if pair != cited]
+
+
+def get_scoped_retriever(app_state) -> ScopedRetriever:
+    """Return the session's retriever, rebuilding it when the vectorstore changes"""
+    if getattr(app_state.vectorstore, "supports_scope", False):
+        # Remote indexes apply the scope inside the search service
+        return app_state.vectorstore
+    retriever = app_state.scoped_retriever
+    if retriever is None or retriever.vectorstore is not app_state.vectorstore:
+        retriever = ScopedRetriever(app_state.vectorstore)
+        app_state.scoped_retriever = retriever
+    return retriever
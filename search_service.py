@@ -0,0 +1,421 @@
+import argparse
+import json
+import os
+import queue
+import re
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+from .chunk_store import ChunkStore, attach_chunk_store, get_chunk_store
+from .models import RetrievalScope, RetrievedChunk
+from .pdf_processor import PDFProcessor
+from .scoped_retrieval import ScopedRetriever
+
+
+# Vectorstore hashes are MD5 hex digests (PDFProcessor.get_pipeline_hash)
+INDEX_HASH_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+def check_index_hash(index_hash) -> str:
+    """Reject index names that are not vectorstore hashes, since they become file paths"""
+    if not isinstance(index_hash, str) or not INDEX_HASH_PATTERN.fullmatch(index_hash):
+        raise ValueError(f"Invalid index {index_hash!r}")
+    return index_hash
+
+
+def parse_address(address: str):
+    """'unix:/path/to.sock' or 'host:port' -> (socket family, socket address)"""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+class SearchServiceError(Exception):
+    """Raised by the client when the search service reports an error"""
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embed requests into one model call.
+
+    The first request opens a batch window of `max_wait` seconds; requests
+    arriving within it (up to `max_batch` texts) share a single
+    embed_documents call.
+    """
+
+    def __init__(self, embeddings, max_batch: int = 64, max_wait: float = 0.005):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            count = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                count += len(item[0])
+
+            try:
+                vectors = self.embeddings.embed_documents([text for texts, _ in batch for text in texts])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.texts += count
+            offset = 0
+            for texts, future in batch:
+                future.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+
+class SearchService:
+    """Owns the embedding model and loaded indexes for every app worker.
+
+    Speaks newline-delimited JSON over a Unix socket or localhost TCP. Each
+    request is {"op": ..., ...} and each response {"ok": true, ...} or
+    {"ok": false, "error": "..."}.
+    """
+
+    def __init__(self, address: str, vector_store_path: str = "vectorstore", pdf_processor: PDFProcessor = None):
+        self.address = address
+        self.processor = pdf_processor or PDFProcessor(vector_store_path)
+        self._indexes: Dict[str, ScopedRetriever] = {}
+        self._lock = threading.Lock()
+        self._batcher = None
+        self._server = None
+
+    def _get_batcher(self) -> EmbeddingBatcher:
+        with self._lock:
+            if self._batcher is None:
+                self._batcher = EmbeddingBatcher(self.processor.get_embeddings())
+            return self._batcher
+
+    def load_index(self, index_hash: str) -> bool:
+        """Load a cached vectorstore into memory if it exists on disk"""
+        check_index_hash(index_hash)
+        with self._lock:
+            if index_hash in self._indexes:
+                return True
+        vectorstore = self.processor.load_vectorstore(index_hash)
+        if vectorstore is None:
+            return False
+        with self._lock:
+            self._indexes.setdefault(index_hash, ScopedRetriever(vectorstore))
+        return True
+
+    def build_index(self, index_hash: str, chunk_store: ChunkStore):
+        """Embed chunks, build the vectorstore, persist it and keep it loaded"""
+        check_index_hash(index_hash)
+        from langchain.vectorstores import FAISS
+
+        vectorstore = FAISS.from_texts(texts=list(chunk_store.texts()), embedding=self.processor.get_embeddings(),
+                                       metadatas=list(chunk_store.metadatas()))
+        attach_chunk_store(vectorstore, chunk_store)
+        self.processor.save_vectorstore(vectorstore, index_hash)
+        with self._lock:
+            self._indexes[index_hash] = ScopedRetriever(vectorstore)
+
+    def get_chunks(self, index_hash: str) -> ChunkStore:
+        """The chunks behind an index, for summaries and memory reports in the app"""
+        if not self.load_index(index_hash):
+            raise ValueError(f"Unknown index {index_hash}")
+        with self._lock:
+            vectorstore = self._indexes[index_hash].vectorstore
+        chunk_store = get_chunk_store(vectorstore)
+        if not len(chunk_store):
+            # Indexes built before ChunkStore keep their chunks in an InMemoryDocstore
+            for docstore_id in vectorstore.index_to_docstore_id.values():
+                doc = vectorstore.docstore.search(docstore_id)
+                chunk_store.add_chunks(chunk_store.add_page(doc.page_content), [doc.page_content], doc.metadata)
+        return chunk_store
+
+    def search(self, index_hash: str, queries: List[str], k: int, scope: Optional[dict] = None) -> List[List[dict]]:
+        """Embed a batch of queries and search one index"""
+        if not self.load_index(index_hash):
+            raise ValueError(f"Unknown index {index_hash}")
+        with self._lock:
+            retriever = self._indexes[index_hash]
+        retrieval_scope = RetrievalScope(**scope) if scope else None
+        return [
+            [{"page_content": doc.page_content, "metadata": doc.metadata}
+             for doc in retriever.similarity_search_by_vector(vector, k, retrieval_scope)]
+            for vector in self._get_batcher().embed(queries)
+        ]
+
+    def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "ping":
+            with self._lock:
+                return {"ok": True, "indexes": sorted(self._indexes)}
+        if op == "embed":
+            return {"ok": True, "vectors": self._get_batcher().embed(request["texts"])}
+        if op == "search":
+            return {"ok": True, "results": self.search(request["index"], request["queries"], int(request.get("k", 4)), request.get("scope"))}
+        if op == "load":
+            return {"ok": True, "loaded": self.load_index(request["index"])}
+        if op == "build":
+            self.build_index(request["index"], ChunkStore.from_dict(request["store"]))
+            return {"ok": True}
+        if op == "chunks":
+            return {"ok": True, "store": self.get_chunks(request["index"]).to_dict()}
+        return {"ok": False, "error": f"Unknown op {op!r}"}
+
+    def serve_forever(self):
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(bind_address):
+                os.remove(bind_address)
+            self._server = _UnixServer(bind_address, _Handler)
+        else:
+            self._server = _TCPServer(bind_address, _Handler)
+        self._server.service = self
+        self._server.serve_forever()
+
+    def start(self) -> "SearchService":
+        """Serve from a background thread (handy for benchmarks)"""
+        threading.Thread(target=self.serve_forever, name="search-service", daemon=True).start()
+        while self._server is None:
+            time.sleep(0.01)
+        return self
+
+    def shutdown(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.service.handle(json.loads(line))
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            try:
+                self.wfile.write((json.dumps(response) + "\n").encode())
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client timed out and gave up on this request
+                return
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    allow_reuse_address = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class SearchServiceClient:
+    """Client for SearchService; reuses connections from a small pool shared by all threads"""
+
+    def __init__(self, address: str, timeout: float = 60, pool_size: int = 8, build_timeout: float = 3600):
+        self.address = address
+        self.timeout = timeout
+        # Embedding a large corpus on CPU takes far longer than a search
+        self.build_timeout = build_timeout
+        self.pool_size = pool_size
+        # Streamlit runs every rerun on a fresh thread, so idle connections
+        # are pooled rather than kept per thread
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        family, address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(address)
+        return sock, sock.makefile("rb")
+
+    def _checkout(self):
+        """A pooled connection if one is idle, else a new one; also says which"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+
+    def _checkin(self, connection):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+                return
+        self._close(connection)
+
+    def _close(self, connection):
+        sock, rfile = connection
+        rfile.close()
+        sock.close()
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._close(connection)
+
+    def request(self, payload: dict, timeout: Optional[float] = None) -> dict:
+        data = (json.dumps(payload) + "\n").encode()
+        connection, reused = self._checkout()
+        while True:
+            sock, rfile = connection
+            sock.settimeout(timeout or self.timeout)
+            stale = False
+            try:
+                try:
+                    sock.sendall(data)
+                except socket.timeout:
+                    raise
+                except OSError:
+                    stale = True
+                    raise
+                line = rfile.readline()
+                if not line:
+                    stale = True
+                    raise ConnectionError("Search service closed the connection")
+            except OSError:
+                self._close(connection)
+                # Only a pooled connection that went stale before any reply is
+                # retried; after a timeout the service may still be working on it
+                if not (stale and reused):
+                    raise
+                connection, reused = self._connect(), False
+                continue
+            self._checkin(connection)
+            break
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise SearchServiceError(response.get("error", "unknown error"))
+        return response
+
+    def ping(self) -> bool:
+        try:
+            self.request({"op": "ping"})
+            return True
+        except (OSError, SearchServiceError):
+            return False
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.request({"op": "embed", "texts": texts})["vectors"]
+
+    def search(self, index_hash: str, queries: List[str], k: int = 4, scope: RetrievalScope = None) -> List[List[dict]]:
+        payload = {"op": "search", "index": index_hash, "queries": queries, "k": k,
+                   "scope": asdict(scope) if scope and not scope.is_unrestricted() else None}
+        return self.request(payload)["results"]
+
+    def open_index(self, index_hash: str) -> Optional["RemoteVectorStore"]:
+        """Ask the service to load a cached index; None if it has no such index"""
+        if self.request({"op": "load", "index": index_hash})["loaded"]:
+            return RemoteVectorStore(self, index_hash)
+        return None
+
+    def build_index(self, index_hash: str, chunk_store: ChunkStore) -> "RemoteVectorStore":
+        """Have the service embed and index the chunks of a ChunkStore"""
+        self.request({"op": "build", "index": index_hash, "store": chunk_store.to_dict()}, timeout=self.build_timeout)
+        return RemoteVectorStore(self, index_hash)
+
+
+class RemoteVectorStore:
+    """Stands in for a FAISS vectorstore whose index lives in the search service"""
+    supports_scope = True
+
+    def __init__(self, client: SearchServiceClient, index_hash: str):
+        self.client = client
+        self.index_hash = index_hash
+
+    def get_chunk_store(self) -> ChunkStore:
+        """Fetch the index's chunks from the service"""
+        return ChunkStore.from_dict(self.client.request({"op": "chunks", "index": self.index_hash})["store"])
+
+    def similarity_search(self, query: str, k: int = 4, scope: RetrievalScope = None) -> List[RetrievedChunk]:
+        results = self.client.search(self.index_hash, [query], k, scope)[0]
+        return [RetrievedChunk(page_content=r["page_content"], metadata=r["metadata"]) for r in results]
+
+
+def run_benchmark(address: str, index_hash: str, queries: List[str], k: int = 5,
+                  concurrency: int = 8, rounds: int = 5, vector_store_path: str = "vectorstore") -> Dict:
+    """Compare search throughput in-process versus through the search service"""
+    workload = queries * rounds
+
+    def measure(search) -> Dict:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(search, workload))
+        elapsed = time.perf_counter() - started
+        return {"queries": len(workload), "seconds": round(elapsed, 3), "qps": round(len(workload) / elapsed, 1)}
+
+    vectorstore = PDFProcessor(vector_store_path).load_vectorstore(index_hash)
+    if vectorstore is None:
+        raise ValueError(f"Unknown index {index_hash}")
+    vectorstore.similarity_search(queries[0], k=k)  # warm up
+    in_process = measure(lambda q: vectorstore.similarity_search(q, k=k))
+
+    client = SearchServiceClient(address)
+    remote = client.open_index(index_hash)
+    remote.similarity_search(queries[0], k=k)
+    service = measure(lambda q: remote.similarity_search(q, k=k))
+
+    return {"concurrency": concurrency, "in_process": in_process, "service": service}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared vector search service for PDF Chat workers")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Run the search service")
+    serve.add_argument("--address", default=os.getenv("SEARCH_SERVICE_ADDRESS", "127.0.0.1:8765"))
+    serve.add_argument("--vector-store-path", default=os.getenv("VECTOR_STORE_PATH", "vectorstore"))
+
+    bench = subparsers.add_parser("bench", help="Compare in-process and service search throughput")
+    bench.add_argument("--address", default=os.getenv("SEARCH_SERVICE_ADDRESS", "127.0.0.1:8765"))
+    bench.add_argument("--vector-store-path", default=os.getenv("VECTOR_STORE_PATH", "vectorstore"))
+    bench.add_argument("--index", required=True, help="Vectorstore hash (file name without .pkl)")
+    bench.add_argument("--query", action="append", help="Query to run (repeatable)")
+    bench.add_argument("--concurrency", type=int, default=8)
+    bench.add_argument("--rounds", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        print(f"Search service listening on {args.address}")
+        SearchService(args.address, args.vector_store_path).serve_forever()
+    else:
+        queries = args.query or ["What is this document about?", "Summarize the key findings", "List the requirements"]
+        result = run_benchmark(args.address, args.index, queries, concurrency=args.concurrency,
+                               rounds=args.rounds, vector_store_path=args.vector_store_path)
+        for mode in ("in_process", "service"):
+            r = result[mode]
+            print(f"{mode:<11} {r['queries']:>5} queries in {r['seconds']:>7.3f}s  {r['qps']:>8.1f} q/s")
+
+
+if __name__ == "__main__":
+    # python -m src.search_service serve --address unix:/tmp/pdf_chat_search.sock
+    main()
@@ -0,0 +1,179 @@
+import sys
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .pdf_processor import loaded_embeddings
+
+
+def model_nbytes(embeddings) -> int:
+    """Parameter memory of the sentence-transformers model behind a LangChain embeddings object"""
+    parameters = getattr(getattr(embeddings, "client", None), "parameters", None)
+    if parameters is None:
+        return 0
+    return sum(p.numel() * p.element_size() for p in parameters())
+
+
+def estimate_session_bytes(app_state, chat_history: Optional[list] = None) -> int:
+    """Approximate memory held by one session's heavy state"""
+    total = 0
+    vectorstore = app_state.vectorstore
+    index = getattr(vectorstore, "index", None)
+    if index is not None and hasattr(index, "ntotal"):
+        total += index.ntotal * index.d * 4
+        total += sys.getsizeof(getattr(vectorstore, "index_to_docstore_id", {})) + 100 * index.ntotal
+    embedding_function = getattr(vectorstore, "embedding_function", None)
+    # The shared model is process memory; a private copy belongs to the session
+    if embedding_function is not None and embedding_function is not loaded_embeddings():
+        total += model_nbytes(embedding_function)
+    if app_state.all_chunks:
+        total += app_state.all_chunks.memory_report()["store_bytes"]
+    for message in chat_history or ():
+        total += sys.getsizeof(message.get("content", "")) + 64 * len(message.get("sources") or ())
+    return total
+
+
+@dataclass
+class SessionRecord:
+    session_key: str
+    user_id: int
+    username: str
+    app_state_ref: weakref.ref
+    chat_history: Optional[list] = None
+    last_active: float = field(default_factory=time.time)
+    estimated_bytes: int = 0
+    running: int = 0
+
+
+class SessionRegistry:
+    """Tracks every logged-in session's memory and offloads idle ones.
+
+    A session idle longer than `idle_timeout` seconds is offloaded: its
+    vectorstore, chunk store, LLM client and chat history are released and
+    rebuilt from the vectorstore cache and the database on its next
+    interaction. When the estimated total exceeds `memory_ceiling` bytes the
+    least recently active sessions (idle at least `min_idle` seconds) are
+    offloaded first, before their timeout.
+
+    The app brackets every rerun with begin() and end(); a session is never
+    offloaded between the two, so a rerun never sees its state disappear.
+    """
+
+    def __init__(self, idle_timeout: float = 1800, memory_ceiling: Optional[int] = None, min_idle: float = 300):
+        self.idle_timeout = idle_timeout
+        self.memory_ceiling = memory_ceiling
+        self.min_idle = min_idle
+        self.offloaded_total = 0
+        self._sessions: Dict[str, SessionRecord] = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._reaper_stop = threading.Event()
+
+    def begin(self, session_key: str, user_id: int, username: str, app_state):
+        """Mark a session as running a rerun; it cannot be offloaded until end()"""
+        with self._lock:
+            record = self._sessions.get(session_key)
+            if record is None or record.app_state_ref() is not app_state:
+                record = SessionRecord(session_key, user_id, username, weakref.ref(app_state))
+                self._sessions[session_key] = record
+            record.running += 1
+            record.last_active = time.time()
+
+    def end(self, session_key: str, chat_history: Optional[list] = None):
+        """Finish a rerun: refresh the session's memory estimate and apply the policy"""
+        with self._lock:
+            record = self._sessions.get(session_key)
+            app_state = record.app_state_ref() if record else None
+            if app_state is not None:
+                record.running = max(0, record.running - 1)
+                record.chat_history = chat_history
+                record.last_active = time.time()
+                record.estimated_bytes = estimate_session_bytes(app_state, chat_history)
+        self.enforce()
+
+    def forget(self, session_key: str):
+        with self._lock:
+            self._sessions.pop(session_key, None)
+
+    def _offload(self, record: SessionRecord) -> bool:
+        app_state = record.app_state_ref()
+        # Never pull state from under a rerun in progress
+        if app_state is None or record.running or app_state.offloaded or app_state.is_processing:
+            return False
+        released = app_state.offload()
+        if record.chat_history:
+            # Cleared in place: the list is the session's own chat_history
+            record.chat_history.clear()
+            app_state.chat_history_offloaded = True
+            app_state.offloaded = released = True
+        if not released:
+            return False
+        record.estimated_bytes = estimate_session_bytes(app_state)
+        self.offloaded_total += 1
+        return True
+
+    def enforce(self) -> List[str]:
+        """Offload idle sessions and, above the memory ceiling, the least recently used ones"""
+        now = time.time()
+        offloaded = []
+        with self._lock:
+            # Sessions whose browser tab is gone are garbage collected by Streamlit
+            for key in [k for k, r in self._sessions.items() if r.app_state_ref() is None]:
+                del self._sessions[key]
+
+            for record in self._sessions.values():
+                if now - record.last_active > self.idle_timeout and self._offload(record):
+                    offloaded.append(record.session_key)
+
+            if self.memory_ceiling:
+                total = sum(r.estimated_bytes for r in self._sessions.values())
+                for record in sorted(self._sessions.values(), key=lambda r: r.last_active):
+                    if total <= self.memory_ceiling:
+                        break
+                    if now - record.last_active < self.min_idle:
+                        continue
+                    before = record.estimated_bytes
+                    if self._offload(record):
+                        total -= before - record.estimated_bytes
+                        offloaded.append(record.session_key)
+        return offloaded
+
+    def get_sessions(self, limit: Optional[int] = None) -> List[Dict]:
+        """Sessions ordered by estimated memory, largest first"""
+        now = time.time()
+        with self._lock:
+            rows = [
+                {
+                    "user": record.username,
+                    "memory_mb": round(record.estimated_bytes / 1e6, 2),
+                    "idle_s": int(now - record.last_active),
+                    "offloaded": bool(getattr(record.app_state_ref(), "offloaded", False)),
+                }
+                for record in self._sessions.values()
+                if record.app_state_ref() is not None
+            ]
+        rows.sort(key=lambda row: row["memory_mb"], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def get_totals(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "memory_mb": round(sum(r.estimated_bytes for r in self._sessions.values()) / 1e6, 2),
+                "ceiling_mb": round(self.memory_ceiling / 1e6, 2) if self.memory_ceiling else None,
+                "offloaded_total": self.offloaded_total,
+            }
+
+    def start_reaper(self, interval: float = 60.0):
+        """Enforce the policy periodically, even when no session is active"""
+        if self._reaper and self._reaper.is_alive():
+            return
+        self._reaper_stop.clear()
+        self._reaper = threading.Thread(target=self._run_reaper, args=(interval,), name="session-reaper", daemon=True)
+        self._reaper.start()
+
+    def _run_reaper(self, interval: float):
+        while not self._reaper_stop.wait(interval):
+            self.enforce()
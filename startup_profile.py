@@ -0,0 +1,93 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import List, Dict
+
+# Modules imported on the way to the login page, followed by the heavy
+# dependencies that should only load once ingest or retrieval needs them.
+DEFAULT_MODULES = [
+    "streamlit",
+    "openai",
+    "requests",
+    "src.auth",
+    "src.database",
+    "src.lm_studio",
+    "src.pdf_processor",
+    "src.ui_components",
+    "PyPDF2",
+    "langchain.text_splitter",
+    "langchain.vectorstores",
+    "langchain.embeddings",
+    "sentence_transformers",
+    "torch",
+]
+
+HEAVY_MODULES = ["torch", "sentence_transformers", "faiss", "langchain", "PyPDF2"]
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def profile_module(module: str, cwd: str = None) -> Dict:
+    """Import a module in a fresh interpreter and measure its cold import time"""
+    check_heavy = "import sys; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    code = f"import {module}; {check_heavy}"
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        capture_output=True,
+        text=True
+    )
+    wall_time = time.perf_counter() - started
+
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+        return {"module": module, "ok": False, "error": error, "wall_s": wall_time}
+
+    # -X importtime reports cumulative microseconds for every module that was
+    # actually imported; the requested module's own line holds the total.
+    cumulative_us = 0
+    imported = 0
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            imported += 1
+            if match.group(3) == module:
+                cumulative_us = int(match.group(2))
+
+    heavy = [name for name in result.stdout.strip().split(",") if name]
+    return {
+        "module": module,
+        "ok": True,
+        "import_s": cumulative_us / 1_000_000,
+        "wall_s": wall_time,
+        "modules_loaded": imported,
+        "heavy_loaded": heavy,
+    }
+
+
+def profile_startup(modules: List[str] = None, cwd: str = None) -> List[Dict]:
+    """Profile cold import time for each module, slowest first"""
+    results = [profile_module(module, cwd) for module in (modules or DEFAULT_MODULES)]
+    return sorted(results, key=lambda r: r.get("import_s", 0), reverse=True)
+
+
+def format_report(results: List[Dict]) -> str:
+    """Format profiling results as a plain-text table"""
+    lines = [f"{'module':<28} {'import (s)':>10} {'wall (s)':>9} {'loaded':>7}  heavy deps pulled in"]
+    lines.append("-" * 90)
+    for r in results:
+        if not r["ok"]:
+            lines.append(f"{r['module']:<28} {'-':>10} {r['wall_s']:>9.2f} {'-':>7}  not importable: {r['error']}")
+            continue
+        heavy = ", ".join(r["heavy_loaded"]) or "-"
+        lines.append(f"{r['module']:<28} {r['import_s']:>10.3f} {r['wall_s']:>9.2f} {r['modules_loaded']:>7}  {heavy}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Run from the project root: python -m src.startup_profile [module ...]
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(format_report(profile_startup(sys.argv[1:] or None, cwd=project_root)))
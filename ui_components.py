@@ -1,5 +1,8 @@
 import streamlit as st
 import json
+from .prompt_templates import format_context
+from .models import RetrievalScope
+from .scoped_retrieval import cite_chunk, get_scoped_retriever
 
 class UIComponents:
     def render_sidebar(self, app_state, pdf_processor, lm_studio_manager, user_id, db_manager):
@@ -26,6 +29,9 @@ class UIComponents:
                 st.success(f"{len(app_state.processed_pdfs)} PDFs processed:")
                 for pdf in app_state.processed_pdfs:
                     st.info(f"📄 {pdf}")
+                if len(app_state.all_chunks):
+                    memory = app_state.all_chunks.memory_report()
+                    st.caption(f"{memory['chunks']} chunks from {memory['pages']} pages in {memory['store_bytes'] / 1e6:.1f} MB")
                 
                 if app_state.vectorstore and app_state.openai_client and app_state.selected_model:
                     if st.button("Summarize Documents"):
@@ -33,7 +39,8 @@ class UIComponents:
                             success, summary = lm_studio_manager.summarize_document(
                                 app_state.all_chunks, 
                                 app_state.selected_model,
-                                app_state.temperature
+                                app_state.temperature,
+                                user_id=user_id
                             )
                             if success:
                                 st.success("Summary generated!")
@@ -43,6 +50,8 @@ class UIComponents:
                             else:
                                 st.error(summary)
             
+                self.render_retrieval_scope(app_state, user_id, db_manager)
+            
             # Show user's document history
             with st.expander("📚 Your Document History"):
                 user_docs = db_manager.get_user_documents(user_id)
@@ -53,11 +62,25 @@ class UIComponents:
                 else:
                     st.info("No documents uploaded yet")
             
+            self.render_history_search(user_id, db_manager)
+            
             # LM Studio connection
             st.subheader("🔌 LM Studio Connection")
             
-            connection_color = "green" if app_state.connection_status == "Connected" else "red"
-            st.markdown(f"Status: <span style='color:{connection_color};font-weight:bold'>{app_state.connection_status}</span>", unsafe_allow_html=True)
+            # The background health probe keeps this status fresh without a request per rerun
+            connection_status = app_state.connection_status
+            if connection_status == "Connected":
+                healthy, probe_message = lm_studio_manager.get_cached_status()
+                if not healthy:
+                    connection_status = probe_message
+                else:
+                    # Models loaded or unloaded in LM Studio show up from the probe-refreshed
+                    # cache; the network is only hit once it is older than its TTL
+                    success, models = lm_studio_manager.get_available_models()
+                    if success:
+                        app_state.available_models = models
+            connection_color = "green" if connection_status == "Connected" else "red"
+            st.markdown(f"Status: <span style='color:{connection_color};font-weight:bold'>{connection_status}</span>", unsafe_allow_html=True)
             
             col1, col2 = st.columns(2)
             with col1:
@@ -68,6 +91,20 @@ class UIComponents:
                 if st.button("Refresh Models", disabled=app_state.connection_status != "Connected"):
                     self.refresh_models(app_state, lm_studio_manager)
                     
+            if app_state.connection_status == "Connected":
+                with st.expander("🖥️ LM Studio Load"):
+                    queue = lm_studio_manager.get_scheduler_metrics()
+                    st.caption(f"Running: {queue['active']}/{queue['max_concurrency']} | "
+                               f"Queued: {queue['queued_interactive']} chat, {queue['queued_batch']} batch | "
+                               f"Avg wait: {queue['queue_wait_seconds_avg']:.2f}s | Rejected: {queue['rejected_total']}")
+                    if len(lm_studio_manager.base_urls) > 1:
+                        for metrics in lm_studio_manager.get_endpoint_metrics():
+                            icon = "🟢" if metrics["healthy"] else "🔴"
+                            latency = f"{metrics['latency_ewma_ms']} ms" if metrics["latency_ewma_ms"] is not None else "n/a"
+                            st.text(f"{icon} {metrics['base_url']}")
+                            st.caption(f"In flight: {metrics['in_flight']} | Avg latency: {latency} | "
+                                       f"Requests: {metrics['requests_total']} | Failures: {metrics['failures_total']}")
+                    
             # Available models dropdown
             if app_state.available_models:
                 selected_model = st.selectbox(
@@ -92,6 +129,91 @@ class UIComponents:
                 app_state.chunk_size = st.number_input("Chunk Size", min_value=500, max_value=5000, value=app_state.chunk_size, step=100)
                 app_state.chunk_overlap = st.number_input("Chunk Overlap", min_value=0, max_value=1000, value=app_state.chunk_overlap, step=50)
                 app_state.similarity_k = st.number_input("Retrieved Chunks", min_value=1, max_value=10, value=app_state.similarity_k, step=1)
+                app_state.deduplicate_chunks = st.checkbox("Skip duplicate chunks", value=app_state.deduplicate_chunks,
+                                                           help="Embed repeated boilerplate (footers, cover pages, identical appendices) only once")
+                
+    def render_session_admin(self, session_registry, limit=10):
+        """Admin view of the sessions holding the most memory"""
+        with st.sidebar.expander("🛡️ Session Memory"):
+            totals = session_registry.get_totals()
+            ceiling = f"{totals['ceiling_mb']:.0f} MB" if totals['ceiling_mb'] else "none"
+            st.caption(f"Sessions: {totals['sessions']} | Total: {totals['memory_mb']:.1f} MB | "
+                       f"Ceiling: {ceiling} | Offloaded so far: {totals['offloaded_total']}")
+            sessions = session_registry.get_sessions(limit)
+            if sessions:
+                st.table(sessions)
+            if st.button("Offload idle sessions now"):
+                offloaded = session_registry.enforce()
+                st.success(f"Offloaded {len(offloaded)} sessions")
+                
+    def render_history_search(self, user_id, db_manager, page_size=10):
+        """Full-text search over the user's past conversations and documents"""
+        with st.expander("🔎 Search History"):
+            query = st.text_input("Search chats and documents", placeholder="e.g. warranty claim, report*")
+            search_in = st.radio("Search in", ["Chats", "Documents"], horizontal=True)
+            if not query.strip():
+                return
+                
+            page = st.number_input("Page", min_value=1, value=1, step=1)
+            offset = (int(page) - 1) * page_size
+            # One extra row tells us whether there is a next page
+            if search_in == "Chats":
+                results = db_manager.search_chat_history(user_id, query, limit=page_size + 1, offset=offset)
+            else:
+                results = db_manager.search_documents(user_id, query, limit=page_size + 1, offset=offset)
+                
+            if not results:
+                st.info("No matches found")
+                return
+            for result in results[:page_size]:
+                if search_in == "Chats":
+                    role = "🤖" if result['type'] == "ai" else "🧑"
+                    st.markdown(f"{role} {result['snippet']}")
+                    st.caption(f"{result['created_at']}")
+                else:
+                    st.text(f"📄 {result['filename']}")
+                    st.caption(f"Uploaded: {result['uploaded_at']}")
+            if len(results) > page_size:
+                st.caption("More results on the next page")
+                
+    def render_retrieval_scope(self, app_state, user_id, db_manager):
+        """Let the user restrict retrieval to some documents, pages and upload dates"""
+        with st.expander("🎯 Search Scope"):
+            selected_pdfs = st.multiselect(
+                "Documents",
+                options=app_state.processed_pdfs,
+                default=app_state.processed_pdfs,
+                help="Only chunks from these documents are searched"
+            )
+            col1, col2 = st.columns(2)
+            with col1:
+                page_min = st.number_input("From page", min_value=0, value=0, step=1, help="0 = first page")
+            with col2:
+                page_max = st.number_input("To page", min_value=0, value=0, step=1, help="0 = last page")
+            
+            if st.checkbox("Filter by upload date"):
+                date_range = st.date_input("Uploaded between", value=())
+                if len(date_range) == 2:
+                    start, end = (d.isoformat() for d in date_range)
+                    uploaded = {
+                        doc['filename'] for doc in db_manager.get_user_documents(user_id)
+                        if start <= str(doc['uploaded_at'])[:10] <= end
+                    }
+                    selected_pdfs = [pdf for pdf in selected_pdfs if pdf in uploaded]
+            
+            page_min, page_max = int(page_min) or None, int(page_max) or None
+            if page_min and page_max and page_min > page_max:
+                st.error("'From page' is after 'To page'; the page range is ignored")
+                page_min = page_max = None
+            
+            sources = None if len(selected_pdfs) == len(app_state.processed_pdfs) else selected_pdfs
+            app_state.retrieval_scope = RetrievalScope(
+                sources=sources,
+                page_min=page_min,
+                page_max=page_max
+            )
+            if sources is not None and not sources:
+                st.warning("No documents match the selected scope")
                 
     def connect_to_lm_studio(self, app_state, lm_studio_manager):
         """Connect to LM Studio API"""
@@ -101,19 +223,16 @@ class UIComponents:
         status_message.info("Connecting to LM Studio...")
         
         try:
-            success, message = lm_studio_manager.check_connection()
+            success, message, models = lm_studio_manager.connect()
             
             if success:
                 app_state.openai_client = lm_studio_manager.setup_client()
                 app_state.connection_status = "Connected"
                 status_message.success("Connected to LM Studio!")
                 
-                success, models = lm_studio_manager.get_available_models()
-                if success and models:
+                if models:
                     app_state.available_models = models
                 else:
-                    if isinstance(models, str):
-                        st.sidebar.warning(models)
                     st.sidebar.warning("Connected to LM Studio, but no models are loaded")
             else:
                 app_state.connection_status = message
@@ -128,7 +247,7 @@ class UIComponents:
         status_message.info("Fetching available models...")
         
         try:
-            success, models_or_error = lm_studio_manager.get_available_models()
+            success, models_or_error = lm_studio_manager.get_available_models(use_cache=False)
             if success:
                 app_state.available_models = models_or_error
                 if models_or_error:
@@ -161,6 +280,7 @@ class UIComponents:
                     with st.expander("View sources"):
                         for i, source in enumerate(message["sources"]):
                             st.markdown(f"**Source {i+1}:** {source.get('source', 'N/A')} (Page {source.get('page', 'N/A')})")
+                            self.render_other_occurrences(source)
                             content_preview = source.get('content', '')
                             st.text(content_preview[:200] + "..." if len(content_preview) > 200 else content_preview)
                             if i < len(message["sources"]) - 1:
@@ -188,21 +308,30 @@ class UIComponents:
                 else:
                     with st.spinner("Searching documents and generating response..."):
                         try:
-                            docs = app_state.vectorstore.similarity_search(user_query, k=app_state.similarity_k)
+                            retriever = get_scoped_retriever(app_state)
+                            docs = retriever.similarity_search(user_query, k=app_state.similarity_k, scope=app_state.retrieval_scope)
+                            if not docs:
+                                # Without context the model would answer ungrounded
+                                response = "No document chunks match the selected search scope. Widen the scope in 🎯 Search Scope and ask again."
+                                st.warning(response)
+                                db_manager.save_chat_message(user_id, "ai", response)
+                                st.session_state.chat_history.append({"type": "ai", "content": response, "sources": None})
+                                return
                             
-                            context_pieces = []
                             sources_info = []
                             for i, doc in enumerate(docs):
-                                source = doc.metadata.get("source", "Unknown")
-                                page = doc.metadata.get("page", "Unknown")
-                                context_pieces.append(f"[Document: {source}, Page: {page}]\n{doc.page_content}")
-                                sources_info.append({"source": source, "page": page, "content": doc.page_content})
+                                # Cite the occurrence that falls inside the active scope
+                                source, page, others = cite_chunk(doc.metadata, app_state.retrieval_scope)
+                                sources_info.append({"source": source, "page": page, "content": doc.page_content,
+                                                     "occurrences": others or None})
                             
-                            context = "\n\n".join(context_pieces)
+                            # Ordered by source/page so follow-up questions share the prompt prefix
+                            context = format_context(sources_info)
                             
                             success, result = lm_studio_manager.get_response(
                                 context, user_query, app_state.selected_model,
-                                app_state.temperature, app_state.max_tokens
+                                app_state.temperature, app_state.max_tokens,
+                                user_id=user_id
                             )
                             
                             if success:
@@ -210,11 +339,10 @@ class UIComponents:
                                 
                                 # Tampilkan sumber untuk pesan baru (logika ini tetap sama)
                                 with st.expander("View sources"):
-                                    for i, doc in enumerate(docs):
-                                        source = doc.metadata.get("source", "Unknown")
-                                        page = doc.metadata.get("page", "Unknown")
-                                        st.markdown(f"**Source {i+1}:** {source} (Page {page})")
-                                        st.text(doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content)
+                                    for i, source in enumerate(sources_info):
+                                        st.markdown(f"**Source {i+1}:** {source['source']} (Page {source['page']})")
+                                        self.render_other_occurrences(source)
+                                        st.text(source['content'][:200] + "..." if len(source['content']) > 200 else source['content'])
                                         st.divider()
                                 
                                 sources_json = json.dumps(sources_info)
@@ -234,6 +362,14 @@ class UIComponents:
                             st.session_state.chat_history.append({"type": "ai", "content": error_msg, "sources": None})
     
                             
+    def render_other_occurrences(self, source):
+        """Caption listing the other pages a deduplicated source chunk appeared on"""
+        # Older history entries still list the cited page among the occurrences
+        cited = [source.get('source'), source.get('page')]
+        others = [pair for pair in source.get('occurrences') or [] if list(pair) != cited]
+        if others:
+            st.caption("Also appears in: " + ", ".join(f"{src} (Page {pg})" for src, pg in others))
+            
     def display_welcome_message(self):
         """Display welcome message when application starts"""
         st.markdown("""